@@ -0,0 +1,236 @@
+"""Benchmark suite of the release notes pipeline.
+
+Builds synthetic repositories of the given sizes, serves their PRs from a
+fake GitHub with configurable latency and reports wall time, requests and
+peak memory per stage, as well as the startup time of the CLI. The
+milestone commands run end to end through the CLI. Compares against
+benchmarks/baselines.json and exits non-zero on regressions.
+
+Run with: python -m benchmarks [--sizes 1000,10000] [--latency 0.01]
+"""
+import argparse
+from contextlib import contextmanager
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+from hassrelease import changelog, git, github, model, users
+from hassrelease.cache import PRStore
+from hassrelease.commands import cli
+from tests.fake_github import FakeGitHub
+
+from . import synthetic
+
+BASELINES = os.path.join(os.path.dirname(__file__), 'baselines.json')
+# Allowed slowdown against the baseline before reporting a regression.
+TIME_TOLERANCE = 2.0
+# Timings below this many seconds are too noisy to compare.
+TIME_FLOOR = 0.05
+# Allowed growth of peak memory against the baseline.
+MEMORY_TOLERANCE = 1.5
+# Peak memory below this many KiB is too noisy to compare.
+MEMORY_FLOOR = 256
+# Runs of the CLI startup benchmark, the fastest one is reported.
+STARTUP_RUNS = 5
+
+
+def bench_git_log(fake):
+    for _ in git.get_log('rc'):
+        pass
+
+
+def bench_log_lines(fake):
+    release = model.Release('0.60.0', branch='rc')
+    release.pr_numbers()
+    release.emails()
+
+
+def bench_update_users(fake):
+    synthetic.write_users('data/users.csv')
+    users._STORE = None
+    release = model.Release('0.60.0', branch='rc')
+    prs = model.PRCache(fake.repo('home-assistant/home-assistant'))
+    users.update_users_with_release(release, prs)
+
+
+def bench_changelog(fake):
+    synthetic.write_users('data/users.csv')
+    users._STORE = None
+    release = model.Release('0.60.0', branch='rc')
+    prs = model.PRCache(fake.repo('home-assistant/home-assistant'),
+                        PRStore('data/bench.db'))
+    prs.store.clear()
+    prs.prefetch(release.pr_numbers())
+    log = changelog.classify(release, prs)
+    for website_tags in True, False:
+        changelog.render(log, website_tags=website_tags)
+
+
+@contextmanager
+def silenced():
+    """Discard all output, including that of git subprocesses."""
+    sys.stdout.flush()
+    saved = os.dup(1)
+
+    with open(os.devnull, 'wt') as devnull:
+        os.dup2(devnull.fileno(), 1)
+        try:
+            yield
+        finally:
+            sys.stdout.flush()
+            os.dup2(saved, 1)
+            os.close(saved)
+
+
+def run_command(fake, args):
+    """Run a hassrelease command with its GitHub session on the fake."""
+    get_session = github.get_session
+    github.get_session = lambda: SimpleNamespace(
+        repository=lambda owner, name: fake.repo(
+            '{}/{}'.format(owner, name)))
+
+    try:
+        cli.main(args, standalone_mode=False)
+    finally:
+        github.get_session = get_session
+
+
+def bench_milestone(fake):
+    run_command(fake, ['milestone-list-commits', '0.60'])
+
+
+def bench_cherry_pick(fake):
+    run_command(fake, ['milestone-cherry-pick', '--milestone', '0.61'])
+
+
+BENCHMARKS = [
+    ('git_log', bench_git_log),
+    ('log_lines', bench_log_lines),
+    ('update_users', bench_update_users),
+    ('changelog', bench_changelog),
+    ('milestone', bench_milestone),
+    ('cherry_pick', bench_cherry_pick),
+]
+
+
+def measure(func, fake):
+    """Return wall time, requests made and peak traced memory of a run."""
+    del fake.requests[:]
+    tracemalloc.start()
+    start = time.perf_counter()
+    with silenced():
+        func(fake)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        'time': round(elapsed, 4),
+        'requests': len(fake.requests),
+        'peak_kb': peak // 1024,
+    }
+
+
+def measure_startup():
+    """Return the wall time of running hassrelease --help."""
+    times = []
+
+    for _ in range(STARTUP_RUNS):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-m', 'hassrelease', '--help'],
+                       stdout=subprocess.DEVNULL, check=True)
+        times.append(time.perf_counter() - start)
+
+    return {'time': round(min(times), 4), 'requests': 0, 'peak_kb': 0}
+
+
+def run(sizes, latency):
+    results = {'startup': measure_startup()}
+    root = os.getcwd()
+    print('{:>22} {:9.4f}s'.format('startup', results['startup']['time']))
+
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp, \
+                FakeGitHub(latency) as fake:
+            cwd = synthetic.workspace(tmp, size)
+            synthetic.populate(fake, os.path.join(tmp, 'home-assistant'),
+                               size)
+            os.chdir(cwd)
+            try:
+                for name, func in BENCHMARKS:
+                    result = measure(func, fake)
+                    results['{}/{}'.format(name, size)] = result
+                    print('{:>22} {:9.4f}s {:6} requests {:9} KiB'.format(
+                        '{} ({})'.format(name, size), result['time'],
+                        result['requests'], result['peak_kb']))
+            finally:
+                for process in git._CAT_FILES.values():
+                    process.close()
+                git._CAT_FILES.clear()
+                os.chdir(root)
+
+    return results
+
+
+def compare(results, baselines):
+    """Return descriptions of results that regressed."""
+    regressions = []
+
+    for key, result in sorted(results.items()):
+        base = baselines.get(key)
+        if base is None:
+            continue
+        if result['requests'] > base['requests']:
+            regressions.append('{}: {} requests, baseline {}'.format(
+                key, result['requests'], base['requests']))
+        if (result['time'] > TIME_FLOOR and
+                result['time'] > base['time'] * TIME_TOLERANCE):
+            regressions.append('{}: {}s, baseline {}s'.format(
+                key, result['time'], base['time']))
+        if (result['peak_kb'] > MEMORY_FLOOR and
+                result['peak_kb'] > base['peak_kb'] * MEMORY_TOLERANCE):
+            regressions.append('{}: {} KiB, baseline {} KiB'.format(
+                key, result['peak_kb'], base['peak_kb']))
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', default='1000',
+                        help='Comma separated numbers of commits')
+    parser.add_argument('--latency', type=float, default=0,
+                        help='Seconds of latency per fake GitHub request')
+    parser.add_argument('--save-baseline', action='store_true')
+    args = parser.parse_args()
+
+    results = run([int(size) for size in args.sizes.split(',')],
+                  args.latency)
+    baselines = {}
+
+    if os.path.isfile(BASELINES):
+        with open(BASELINES) as inp:
+            baselines = json.load(inp)
+
+    if args.save_baseline:
+        baselines.update(results)
+        with open(BASELINES, 'wt') as outp:
+            json.dump(baselines, outp, indent=1, sort_keys=True)
+            outp.write('\n')
+        print('Saved baselines to', BASELINES)
+        return
+
+    regressions = compare(results, baselines)
+
+    for regression in regressions:
+        print('Regression', regression)
+
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""Micro-benchmark of changelog label classification.
+
+Run with: python -m benchmarks.bench_labels [number of PRs]
+"""
+from distutils.version import StrictVersion
+import random
+import sys
+import time
+from types import SimpleNamespace
+
+from hassrelease import changelog
+from hassrelease.model import PR, LogLine
+
+
+def synthetic_release(count, seed=0):
+    """Return a release and PRs with a realistic mix of labels."""
+    rnd = random.Random(seed)
+    labels = (['platform: {}.p{}'.format(domain, num)
+               for domain in ('light', 'sensor', 'switch', 'automation')
+               for num in range(500)] +
+              ['component: c{}'.format(num) for num in range(1000)] +
+              ['component: recorder', 'new-platform', 'new-feature',
+               'breaking change', 'cherry-picked', 'reverted', 'docs'])
+    lines = []
+    prs = {}
+
+    for number in range(1, count + 1):
+        lines.append(LogLine('{:040x}'.format(number), (),
+                             'u{}@example.com'.format(number % 300),
+                             'Change {} (#{})'.format(number, number)))
+        prs[number] = PR({
+            'number': number, 'milestone': None,
+            'labels': rnd.sample(labels, rnd.randint(1, 4))})
+
+    release = SimpleNamespace(
+        version=StrictVersion('0.60.0'), is_patch_release=False,
+        log_lines=lambda: lines,
+        emails=lambda: list({line.email: None for line in lines}))
+    users = {line.email: 'user' for line in lines}
+    return release, SimpleNamespace(get=prs.get), users
+
+
+def legacy_labels(labels, website_tags):
+    """The former per label linear scans, kept as a baseline."""
+    parts = []
+    links = set()
+
+    for label in labels:
+        item = None
+        for doc_label in changelog.DOCS_LABELS:
+            if label.startswith(doc_label):
+                item = label[len(doc_label):]
+                break
+        if not item:
+            continue
+        link = changelog.LINK_DEF_DOC.format(item)
+        for match, action in changelog.LABEL_MAP.items():
+            if item.startswith(match):
+                if action is None:
+                    item = None
+                else:
+                    link = action(item, website_tags)
+                break
+        if item:
+            parts.append(changelog.DOC_TEMPLATE.format(item))
+            links.add(link)
+
+    return parts, links
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def main(count=5000):
+    release, prs, users = synthetic_release(count)
+    changelog.update_users_with_release = lambda release, prs: users
+    all_labels = [prs.get(number).labels for number in range(1, count + 1)]
+
+    _, legacy = timed(lambda: [
+        legacy_labels(labels, website_tags)
+        for website_tags in (True, False) for labels in all_labels])
+
+    changelog.classify_label.cache_clear()
+    log, classify = timed(lambda: changelog.classify(release, prs))
+    _, render = timed(lambda: [
+        changelog.render(log, website_tags=website_tags)
+        for website_tags in (True, False)])
+
+    print('{} PRs, {} distinct labels'.format(
+        count, len(set(label for labels in all_labels for label in labels))))
+    print('legacy label scans, both formats  {:8.4f}s'.format(legacy))
+    print('classify (memoized labels)        {:8.4f}s'.format(classify))
+    print('render both formats               {:8.4f}s'.format(render))
+    print('label cache', changelog.classify_label.cache_info())
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,57 @@
+"""Compare requests needed to list the merged PRs of a milestone.
+
+Run with: python -m benchmarks.bench_milestone [number of PRs]
+"""
+import sys
+import time
+
+from hassrelease.github import get_milestone_prs
+from tests.fake_github import FakeGitHub, make_issue
+
+
+def list_per_pull(repo, number):
+    """The former approach: list issues, then fetch every pull."""
+    commits = []
+    page = 1
+
+    while True:
+        issues = repo.session.get(
+            '{}/issues'.format(repo._api), params={
+                'milestone': number, 'state': 'closed', 'per_page': 100,
+                'page': page}).json()
+        if not issues:
+            return commits
+
+        for issue in issues:
+            pull = repo.session.get(
+                '{}/pulls/{}'.format(repo._api, issue['number'])).json()
+            if pull['merged']:
+                commits.append(pull['merge_commit_sha'])
+
+        page += 1
+
+
+def list_bulk(repo, number):
+    return [pr.merge_commit_sha for pr in get_milestone_prs(repo, number)
+            if pr.merged]
+
+
+def main(count=400):
+    with FakeGitHub() as fake:
+        fake.issues['o/r'] = {
+            number: make_issue(number, merged=number % 10 != 0)
+            for number in range(1, count + 1)}
+        fake.milestones['o/r'] = {1: list(range(1, count + 1))}
+        repo = fake.repo('o/r')
+
+        for name, func in ('per pull', list_per_pull), ('bulk', list_bulk):
+            del fake.requests[:]
+            start = time.perf_counter()
+            commits = func(repo, 1)
+            print('{:10} {:5} requests {:8.3f}s  {} commits'.format(
+                name, len(fake.requests), time.perf_counter() - start,
+                len(commits)))
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
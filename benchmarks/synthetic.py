@@ -0,0 +1,112 @@
+"""Synthetic HASS repositories and GitHub data for benchmarks."""
+import os
+import subprocess
+
+from tests.fake_github import make_issue
+
+CONST = b"""MAJOR_VERSION = 0
+MINOR_VERSION = 60
+PATCH_VERSION = '0'
+__short_version__ = '{}.{}'.format(MAJOR_VERSION, MINOR_VERSION)
+__version__ = '{}.{}'.format(__short_version__, PATCH_VERSION)
+"""
+AUTHORS = 300
+# PRs in the milestone that is cherry picked.
+CHERRY_PICKS = 50
+LABELS = ['new-platform', 'new-feature', 'breaking change', 'cherry-picked',
+          'platform: light.hue', 'component: recorder', 'docs']
+
+
+def email(number):
+    """Author email of a commit, a noreply address for every third user."""
+    user = number % AUTHORS
+    if user % 3 == 0:
+        return '{}+user{}@users.noreply.github.com'.format(user, user)
+    return 'user{}@example.com'.format(user)
+
+
+def create_repo(path, commits):
+    """Create a repository with an rc branch of commits on origin/master.
+
+    Every other commit references a PR and adds a file of its own, so any
+    of them can be cherry picked onto master. The repository is its own
+    origin, with dev and rc at the same commit. Built with git
+    fast-import, so 100k commits take seconds.
+    """
+    subprocess.run(['git', 'init', '-q', path], check=True)
+    stream = [
+        b'blob\nmark :1\ndata %d\n%s\n' % (len(CONST), CONST),
+        b'commit refs/heads/master\nmark :2\n'
+        b'committer Base <base@example.com> 1500000000 +0000\n'
+        b'data 4\nBase\nM 100644 :1 homeassistant/const.py\n\n',
+        b'reset refs/heads/rc\nfrom :2\n\n',
+    ]
+
+    for number in range(1, commits + 1):
+        subject = 'Change {}'.format(number)
+        if number % 2:
+            subject += ' (#{})'.format(number)
+        subject = subject.encode()
+        author = 'User <{}> {} +0000'.format(
+            email(number), 1500000000 + number).encode()
+        stream.append(
+            b'commit refs/heads/rc\n'
+            b'author %s\ncommitter %s\ndata %d\n%s\n'
+            b'M 100644 inline changes/%d\ndata 2\n%d\n\n' % (
+                author, author, len(subject), subject, number, number % 10))
+
+    subprocess.run(['git', 'fast-import', '--quiet'], cwd=path, check=True,
+                   input=b''.join(stream))
+
+    for args in (['update-ref', 'refs/heads/dev', 'refs/heads/rc'],
+                 ['config', 'user.name', 'Release Manager'],
+                 ['config', 'user.email', 'release@example.com'],
+                 ['remote', 'add', 'origin', path],
+                 ['fetch', '-q', 'origin'],
+                 ['checkout', '-q', '-f', 'master']):
+        subprocess.run(['git'] + args, cwd=path, check=True)
+
+
+def populate(fake, path, commits, name='home-assistant/home-assistant'):
+    """Serve the PRs and commit authors of a synthetic repository.
+
+    Milestone 0.60 holds all PRs, 0.61 the last CHERRY_PICKS.
+    """
+    numbers = list(range(1, commits + 1, 2))
+    fake.issues[name] = {
+        number: make_issue(number, labels=[
+            LABELS[number % len(LABELS)], LABELS[number % 5]],
+            login='user{}'.format(number % AUTHORS))
+        for number in numbers}
+    fake.milestones[name] = {1: numbers, 2: numbers[-CHERRY_PICKS:]}
+    fake.milestone_info[name] = [
+        {'number': 1, 'title': '0.60', 'state': 'open'},
+        {'number': 2, 'title': '0.61', 'state': 'open'}]
+
+    log = subprocess.run(['git', 'log', '--format=%H %ae', 'rc'], cwd=path,
+                         check=True, stdout=subprocess.PIPE).stdout
+    fake.commits[name] = {
+        sha: address.split('@')[0] for sha, address in
+        (line.split() for line in log.decode().splitlines())}
+
+
+def write_users(path):
+    """Write a users file knowing a third of the authors.
+
+    Noreply authors resolve locally, the others are looked up on GitHub.
+    """
+    with open(path, 'wt') as outp:
+        for user in range(AUTHORS):
+            if user % 3 == 1:
+                outp.write('user{0}@example.com,user{0}\n'.format(user))
+
+
+def workspace(root, commits):
+    """Create root/home-assistant and root/hassrelease/data.
+
+    Returns the directory to run hassrelease from.
+    """
+    create_repo(os.path.join(root, 'home-assistant'), commits)
+    cwd = os.path.join(root, 'hassrelease')
+    os.makedirs(os.path.join(cwd, 'data'))
+    return cwd
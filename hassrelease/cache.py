@@ -0,0 +1,65 @@
+import json
+import sqlite3
+import threading
+import time
+
+from .const import CACHE_FILE, PR_CACHE_MAX_AGE
+
+
+class PRStore:
+    """Persistent PR data keyed by repository and PR number."""
+
+    def __init__(self, path=CACHE_FILE, max_age=PR_CACHE_MAX_AGE):
+        # PRCaches of several repositories may load PRs in worker threads
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS prs ('
+            'repo TEXT NOT NULL, number INTEGER NOT NULL, data TEXT NOT NULL, '
+            'etag TEXT, fetched_at REAL NOT NULL, '
+            'PRIMARY KEY (repo, number))')
+        self.prune(max_age)
+
+    def get(self, repo, number):
+        """Return (data, etag, fetched_at) of a cached PR or None."""
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT data, etag, fetched_at FROM prs '
+                'WHERE repo = ? AND number = ?', (repo, number)).fetchone()
+
+        if row is None:
+            return None
+
+        return json.loads(row[0]), row[1], row[2]
+
+    def put(self, repo, number, data, etag=None):
+        """Store a freshly fetched PR."""
+        self.put_many(repo, [(number, data, etag)])
+
+    def put_many(self, repo, entries):
+        """Store (number, data, etag) entries in one transaction."""
+        now = time.time()
+        with self.lock, self.conn:
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO prs VALUES (?, ?, ?, ?, ?)',
+                [(repo, number, json.dumps(data), etag, now)
+                 for number, data, etag in entries])
+
+    def touch(self, repo, number):
+        """Mark a cached PR as revalidated."""
+        with self.lock, self.conn:
+            self.conn.execute(
+                'UPDATE prs SET fetched_at = ? WHERE repo = ? AND number = ?',
+                (time.time(), repo, number))
+
+    def prune(self, max_age=PR_CACHE_MAX_AGE):
+        """Evict PRs that have not been revalidated for max_age seconds."""
+        with self.lock, self.conn:
+            return self.conn.execute(
+                'DELETE FROM prs WHERE fetched_at < ?',
+                (time.time() - max_age,)).rowcount
+
+    def clear(self):
+        """Remove all cached PRs. Returns number of PRs removed."""
+        with self.lock, self.conn:
+            return self.conn.execute('DELETE FROM prs').rowcount
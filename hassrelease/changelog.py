@@ -1,9 +1,14 @@
-from collections import OrderedDict
+from collections import OrderedDict, namedtuple
 from datetime import datetime
 from distutils.version import StrictVersion
+from functools import lru_cache
+import json
 import sys
 
+from .const import LABEL_CHERRY_PICKED, USERS_FILE
+from .profiling import phase
 from .users import update_users_with_release
+from .util import atomic_write_json
 
 INFO_TEMPLATE = '([@{0}] - [#{1}])'
 PR_TEMPLATE = '([#{0}])'
@@ -14,6 +19,7 @@ GITHUB_LINK_DEF_DOC = '[{0} docs]: https://www.home-assistant.io/components/{0}/
 LINK_DEF_DOC = '[{0} docs]: /components/{0}/'
 DOCS_LABELS = set(['platform: ', 'component: '])
 IGNORE_LINE_LABELS = set(['reverted'])
+DATE_FORMAT = '%Y-%m-%dT%H:%M:%S'
 LABEL_HEADERS = {
     'new-platform': 'New Platforms',
     'new-feature': 'New Features',
@@ -59,62 +65,128 @@ LABEL_MAP = {
 }
 
 
-def _process_doc_label(label, parts, links, website_tags):
-    """Process doc labels."""
-    item = None
+LabelInfo = namedtuple('LabelInfo', 'doc group suffix ignore')
 
-    for doc_label in DOCS_LABELS:
-        if label.startswith(doc_label):
-            item = label[len(doc_label):]
-            break
-
-    if not item:
-        return
-
-    part = DOC_TEMPLATE.format(item)
-    if website_tags:
-        link = LINK_DEF_DOC.format(item)
-    else:
-        link = GITHUB_LINK_DEF_DOC.format(item)
 
+@lru_cache(maxsize=None)
+def _doc_link(item, website_tags):
+    """Return the link definition for a documentation item."""
     for match, action in LABEL_MAP.items():
         if item.startswith(match):
-            if action is None:
-                # Ignore item completely
-                return
-            else:
-                link = action(item, website_tags)
-            break
+            return action(item, website_tags)
 
-    parts.append(part)
-    links.add(link)
+    if website_tags:
+        return LINK_DEF_DOC.format(item)
+    return GITHUB_LINK_DEF_DOC.format(item)
 
 
-def generate(release, prs, *, website_tags):
-    """Generate a changelog.
+@lru_cache(maxsize=None)
+def classify_label(label):
+    """Classify a label once for all PRs and output formats.
 
-    website_tags: boolean if we should include tags for home-assistant.io
+    Returns the documentation item, the changelog group, the suffix added
+    to lines in that group and if lines with the label are ignored.
     """
-    users = update_users_with_release(release, prs)
+    prefix, sep, item = label.partition(': ')
+    doc = None
+
+    if item and prefix + sep in DOCS_LABELS:
+        doc = item
+        for match, action in LABEL_MAP.items():
+            if item.startswith(match):
+                if action is None:
+                    # Ignore item completely
+                    doc = None
+                break
+
+    group = suffix = None
+    if label in LABEL_HEADERS:
+        group = label
+        if label == LABEL_CHERRY_PICKED:
+            suffix = '(beta fix)'
+        else:
+            suffix = '({})'.format(label)
+
+    return LabelInfo(doc, group, suffix, label in IGNORE_LINE_LABELS)
+
+
+class Change:
+    """A line of the changelog, independent of the output format."""
+
+    def __init__(self, message, user, pr, docs=(), groups=(), labels=(),
+                 sha=None):
+        self.message = message
+        self.user = user
+        self.pr = pr
+        self.sha = sha
+        self.docs = list(docs)
+        self.groups = list(groups)
+        self.labels = list(labels)
+
+    def as_dict(self):
+        return dict(vars(self))
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+
+class Changelog:
+    """The classified changes of a release."""
+
+    def __init__(self, version, is_patch_release, groups, changes,
+                 date=None):
+        self.version = version
+        self.is_patch_release = is_patch_release
+        self.groups = list(groups)
+        self.changes = changes
+        self.date = date or datetime.now()
+
+    def as_dict(self):
+        return {
+            'version': self.version,
+            'is_patch_release': self.is_patch_release,
+            'groups': self.groups,
+            'date': self.date.strftime(DATE_FORMAT),
+            'changes': [change.as_dict() for change in self.changes],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['version'], data['is_patch_release'], data['groups'],
+                   [Change.from_dict(change) for change in data['changes']],
+                   datetime.strptime(data['date'], DATE_FORMAT))
+
+
+def save(log, path):
+    """Store a classified changelog as JSON."""
+    atomic_write_json(path, log.as_dict(), indent=1)
+
+
+def load(path):
+    """Load a changelog stored with save."""
+    with open(path, 'rt') as inp:
+        return Changelog.from_dict(json.load(inp))
+
 
-    label_groups = OrderedDict()
-    label_groups['new-platform'] = []
-    label_groups['new-feature'] = []
-    label_groups['breaking change'] = []
+def classify(release, prs):
+    """Classify the changes of a release in a single pass."""
+    with phase('user resolution'):
+        users = update_users_with_release(release, prs)
+
+    with phase('generation'):
+        return _classify(release, prs, users)
+
+
+def _classify(release, prs, users):
+    groups = ['new-platform', 'new-feature', 'breaking change']
     if release.version.version[-1] == 0:
         # Only add 'beta fix' for 0-release
-        label_groups['cherry-picked'] = []
+        groups.append('cherry-picked')
 
     changes = []
-    links = set()
+    unresolved = []
     for line in release.log_lines():
-        labels = []
-        parts = ['-', line.message]
-
-        if line.email not in users:
-            print('Error! Found unresolved user', line.email)
-            sys.exit(1)
-
         # Filter out git commits that are not merge commits
         if line.pr is None:
             continue
@@ -122,44 +194,73 @@ def generate(release, prs, *, website_tags):
         pr = prs.get(line.pr)
 
         if (pr.milestone is not None and
-            StrictVersion(pr.milestone.title).version !=
+            StrictVersion(pr.milestone).version !=
                 release.version.version):  # Ignore beta version tag
             continue
 
-        labels = [label.name for label in pr.labels()]
+        labels = pr.labels
+        infos = [classify_label(label) for label in labels]
 
         # Filter out commits for which the PR has one of the ignored labels
-        if any(label in IGNORE_LINE_LABELS for label in labels):
+        if any(info.ignore for info in infos):
             continue
 
-        links.add(LINK_DEF_USER.format(users[line.email]))
-        parts.append(INFO_TEMPLATE.format(users[line.email], line.pr))
-        links.add(LINK_DEF_PR.format(line.pr))
+        # Emails nobody could resolve are stored with an empty username
+        if line.email not in users or not users[line.email]:
+            if line.email not in unresolved:
+                unresolved.append(line.email)
+            continue
+
+        changes.append(Change(
+            line.message, users[line.email], line.pr,
+            [info.doc for info in infos if info.doc],
+            [info.group for info in infos if info.group in groups], labels,
+            line.sha))
+
+    if unresolved:
+        for email in unresolved:
+            print('Error! Found unresolved user', email)
+        print('Add their GitHub usernames to', USERS_FILE)
+        sys.exit(1)
+
+    return Changelog(str(release.version), release.is_patch_release,
+                     groups, changes)
+
+
+def render(log, *, website_tags):
+    """Render a classified changelog.
+
+    website_tags: boolean if we should include tags for home-assistant.io
+    """
+    label_groups = OrderedDict((label, []) for label in log.groups)
+    changes = []
+    links = set()
 
-        for label in labels:
-            _process_doc_label(label, parts, links, website_tags)
+    for change in log.changes:
+        parts = ['-', change.message,
+                 INFO_TEMPLATE.format(change.user, change.pr)]
+        links.add(LINK_DEF_USER.format(change.user))
+        links.add(LINK_DEF_PR.format(change.pr))
 
-        for label in labels:
-            if label in label_groups:
-                if label == 'cherry-picked':
-                    parts.append("(beta fix)")
-                else:
-                    parts.append("({})".format(label))
+        for item in change.docs:
+            parts.append(DOC_TEMPLATE.format(item))
+            links.add(_doc_link(item, website_tags))
+
+        for label in change.groups:
+            parts.append(classify_label(label).suffix)
 
         msg = ' '.join(parts)
         changes.append(msg)
 
-        for label in labels:
-            if label not in label_groups:
-                continue
+        for label in change.groups:
             label_groups[label].append(msg)
 
     outp = []
 
-    if release.is_patch_release:
+    if log.is_patch_release:
         if website_tags:
-            now = datetime.now()
-            outp.append(f'## {{% linkable_title Release {release.version} - {now.strftime("%B")} {now.day} %}}')
+            date = log.date
+            outp.append(f'## {{% linkable_title Release {log.version} - {date.strftime("%B")} {date.day} %}}')
             outp.append('')
 
     else:
@@ -190,3 +291,11 @@ def generate(release, prs, *, website_tags):
     outp.append('')
     outp.extend(sorted(links))
     return '\n'.join(outp)
+
+
+def generate(release, prs, *, website_tags):
+    """Generate a changelog.
+
+    website_tags: boolean if we should include tags for home-assistant.io
+    """
+    return render(classify(release, prs), website_tags=website_tags)
@@ -0,0 +1,148 @@
+import json
+import os
+import sys
+
+from . import git
+from .const import CHERRY_PICK_JOURNAL, PATCH_ID_INDEX
+from .util import atomic_write_json
+
+
+class CherryPickPlan:
+    """Ordered commits to cherry pick, journaled so a run can resume.
+
+    plan is a list of (PR number, merge commit SHA, title).
+    """
+
+    def __init__(self, data, path=CHERRY_PICK_JOURNAL):
+        self.data = data
+        self.path = path
+
+    @classmethod
+    def create(cls, milestone, cwd, plan, path=CHERRY_PICK_JOURNAL):
+        plan = cls({
+            'milestone': milestone,
+            'cwd': cwd,
+            'start': git.rev_parse('HEAD', cwd),
+            'plan': [list(entry) for entry in plan],
+            'applied': [],
+            'labelled': [],
+        }, path)
+        plan.save()
+        return plan
+
+    @classmethod
+    def load(cls, path=CHERRY_PICK_JOURNAL):
+        """Load the plan of an unfinished run or None."""
+        if not os.path.isfile(path):
+            return None
+
+        with open(path, 'rt') as inp:
+            return cls(json.load(inp), path)
+
+    @property
+    def milestone(self):
+        return self.data['milestone']
+
+    def save(self):
+        atomic_write_json(self.path, self.data, indent=1)
+
+    def discard(self):
+        if os.path.isfile(self.path):
+            os.remove(self.path)
+
+    def sync(self):
+        """Find out which commits made it into the branch."""
+        shas = [sha for _, sha, _ in self.data['plan']]
+        applied = git.applied_commits(
+            shas, self.data['start'], self.data['cwd'])
+        self.data['applied'] = [
+            number for number, sha, _ in self.data['plan'] if sha in applied]
+        self.save()
+
+    def run(self, label):
+        """Apply the remaining commits in one go and label applied PRs.
+
+        label is called with the PR number of every applied commit.
+        Returns if all commits have been applied.
+        """
+        cwd = self.data['cwd']
+
+        if git.cherry_pick_in_progress(cwd):
+            sys.stderr.write(
+                'A cherry pick is in progress in {}. Resolve the conflicts '
+                'and run git cherry-pick --continue first.\n'.format(cwd))
+            return False
+
+        self.sync()
+        self._label(label)
+        pending = [entry for entry in self.data['plan']
+                   if entry[0] not in self.data['applied']]
+
+        for number, sha, title in pending:
+            print("Cherry picking {}: {}".format(title, sha))
+
+        done = not pending or git.cherry_pick(
+            [sha for _, sha, _ in pending], cwd)
+
+        self.sync()
+        self._label(label)
+
+        if done:
+            self.discard()
+
+        return done
+
+    def _label(self, label):
+        for number in self.data['applied']:
+            if number in self.data['labelled']:
+                continue
+            label(number)
+            self.data['labelled'].append(number)
+            self.save()
+
+
+class PatchIdIndex:
+    """Patch ids of the commits on a branch that are not on base.
+
+    Identifies commits that have been cherry picked already, whether or
+    not the PR was labelled. Stored on disk and updated incrementally
+    with the commits added since the last run.
+    """
+
+    def __init__(self, cwd, base='origin/master', path=PATCH_ID_INDEX):
+        self.cwd = cwd
+        self.base = base
+        self.path = path
+        self.ids = {}
+        self._update()
+
+    def _update(self):
+        base = git.rev_parse(self.base, self.cwd)
+        head = git.rev_parse('HEAD', self.cwd)
+        data = None
+
+        if os.path.isfile(self.path):
+            with open(self.path, 'rt') as inp:
+                data = json.load(inp)
+
+        if (data is not None and data['cwd'] == self.cwd and
+                data['base'] == base and
+                git.is_ancestor(data['head'], head, self.cwd)):
+            self.ids = data['ids']
+            if data['head'] != head:
+                self.ids.update(git.patch_ids(
+                    ['{}..{}'.format(data['head'], head)], self.cwd))
+        else:
+            self.ids = git.patch_ids(['{}..{}'.format(base, head)], self.cwd)
+
+        atomic_write_json(self.path, {'cwd': self.cwd, 'base': base,
+                                      'head': head, 'ids': self.ids})
+
+    def applied(self, shas):
+        """Return which commits have a change that is on the branch."""
+        if not shas:
+            return set()
+
+        return set(sha for patch_id, sha in git.patch_ids(
+            ['--no-walk=unsorted'] + list(shas), self.cwd).items()
+            if patch_id in self.ids)
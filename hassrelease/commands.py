@@ -1,16 +1,94 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import json
 import os
 import re
+import sys
 
 import click
 
-from . import git, github, changelog, model
-from .const import LABEL_CHERRY_PICKED
-from .util import copy_clipboard
+# Command modules import github3.py and friends, which is slow. Commands
+# import what they need so --help and offline commands start quickly.
+from . import profiling
+from .const import HASS_REPO, LABEL_CHERRY_PICKED, PR_CACHE_TTL
+from .util import atomic_write_json, copy_clipboard
 
 
 @click.group()
-def cli():
-    pass
+@click.option('--stats', is_flag=True,
+              help='Print timings, API calls and cache hit rates.')
+@click.option('--stats-json', type=click.Path(dir_okay=False),
+              help='Write the statistics as JSON to a file.')
+@click.option('--profile', type=click.Path(dir_okay=False),
+              help='Write cProfile data of the command to a file.')
+@click.option('--record', type=click.Path(file_okay=False),
+              help='Archive all GitHub responses in a directory.')
+@click.option('--replay', type=click.Path(file_okay=False),
+              help='Serve GitHub responses from a recording, offline.')
+@click.pass_context
+def cli(ctx, stats, stats_json, profile, record, replay):
+    if record and replay:
+        sys.stderr.write('Pass either --record or --replay\n')
+        sys.exit(1)
+
+    if profile:
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+        def dump():
+            profiler.disable()
+            profiler.dump_stats(profile)
+
+        ctx.call_on_close(dump)
+
+    if stats:
+        ctx.call_on_close(profiling.stats.print_table)
+
+    if stats_json:
+        ctx.call_on_close(
+            lambda: profiling.stats.write_json(stats_json))
+
+
+def prefetch(prs, numbers):
+    """Bulk load PRs into the cache and report the requests saved."""
+    loaded, requests = prs.prefetch(numbers)
+    print('Prefetched {} PRs in {} requests ({} requests saved)'.format(
+        loaded, requests, loaded - requests))
+    # Fetch whatever GraphQL could not resolve
+    prs.get_many(numbers)
+
+
+def pr_store():
+    """Return the persistent PR store, or an empty one in memory."""
+    from . import cache, github
+
+    if github.persistent_caches():
+        return cache.PRStore()
+
+    return cache.PRStore(':memory:')
+
+
+def load_checkpoint(path):
+    """Return the checkpoint of a previous run or None if unreadable."""
+    if not os.path.isfile(path):
+        return None
+
+    try:
+        with open(path, 'rt') as inp:
+            return json.load(inp)
+    except ValueError:
+        print('Ignoring unreadable checkpoint', path)
+        return None
+
+
+def write_notes(rel, log):
+    """Render the website and GitHub release notes of a changelog."""
+    from . import changelog
+
+    for suffix, website_tags in ('', True), ('-github', False):
+        with open('data/{}{}.md'.format(rel.identifier, suffix), 'wt') as outp:
+            outp.write(changelog.render(log, website_tags=website_tags))
 
 
 @cli.command(help='Generate release notes for Home Assistant.')
@@ -18,23 +96,52 @@ def cli():
 @click.option('--force-update/--no-force-update', default=False)
 @click.option('--release', default=None)
 def release_notes(branch, force_update, release):
+    from . import changelog, git, github, model
+
     if release is None:
         release = git.get_hass_version(branch)
         print("Auto detected version", release)
 
     rel = model.Release(release, branch=branch)
+    file_data = 'data/{}.json'.format(rel.identifier)
     file_website = 'data/{}.md'.format(rel.identifier)
     file_github = 'data/{}-github.md'.format(rel.identifier)
+    file_checkpoint = 'data/{}-checkpoint.json'.format(rel.base_identifier)
 
-    if force_update or not os.path.isfile(file_website):
+    if force_update or not (os.path.isfile(file_website) or
+                            os.path.isfile(file_data)):
         gh_session = github.get_session()
         repo = gh_session.repository('home-assistant', 'home-assistant')
-        prs = model.PRCache(repo)
+        # Revalidate every cached PR when forcing an update.
+        prs = model.PRCache(repo, pr_store(),
+                            ttl=0 if force_update else PR_CACHE_TTL)
+
+        with profiling.phase('git log'):
+            new_prs = None
+            checkpoint = load_checkpoint(file_checkpoint)
+            if checkpoint is not None:
+                new_prs = rel.resume(checkpoint)
+            pr_numbers = rel.pr_numbers()
+
+        with profiling.phase('PR fetch'):
+            if new_prs is not None:
+                print('Resuming from last run, found {} new PRs'.format(
+                    len(new_prs)))
+            # New PRs and older ones gone stale load in the same batches,
+            # which picks up label and milestone changes of older PRs
+            prefetch(prs, pr_numbers)
 
-        for file, website_tags in (file_website, True), (file_github, False):
-            with open(file, 'wt') as outp:
-                outp.write(changelog.generate(
-                    rel, prs, website_tags=website_tags))
+        log = changelog.classify(rel, prs)
+
+        with profiling.phase('file write'):
+            changelog.save(log, file_data)
+            write_notes(rel, log)
+
+            atomic_write_json(file_checkpoint, rel.checkpoint())
+
+    elif not os.path.isfile(file_website):
+        with profiling.phase('file write'):
+            write_notes(rel, changelog.load(file_data))
 
     input('Press enter to copy website changelog to clipboard')
     with open(file_website, 'rt') as file:
@@ -45,49 +152,115 @@ def release_notes(branch, force_update, release):
         copy_clipboard(file.read())
 
 
+@cli.command(help='Render release notes from stored release data.')
+@click.argument('release')
+def render(release):
+    from . import changelog, model
+
+    rel = model.Release(release, branch=None)
+    file_data = 'data/{}.json'.format(rel.identifier)
+
+    if not os.path.isfile(file_data):
+        sys.stderr.write('No release data found at {}\n'.format(file_data))
+        sys.stderr.write('Run release_notes first\n')
+        sys.exit(1)
+
+    write_notes(rel, changelog.load(file_data))
+    print('Rendered release notes for', rel.identifier)
+
+
 @cli.command(help='Cherry pick all merged PRs into the current branch.')
 @click.option('--remote-repository', default='home-assistant')
 @click.option('--local-repository', default='../home-assistant')
 @click.option('--milestone', default=None)
-def milestone_cherry_pick(remote_repository, local_repository, milestone):
+@click.option('--discard-progress/--no-discard-progress', default=False,
+              help='Forget an unfinished run instead of resuming it.')
+def milestone_cherry_pick(remote_repository, local_repository, milestone,
+                          discard_progress):
+    from . import cherrypick, git, github, labels, prindex
+
     gh_session = github.get_session()
     repo = gh_session.repository('home-assistant', remote_repository)
+    # Labels are added in the background while git does its work
+    label_queue = labels.LabelQueue(repo)
+    plan = cherrypick.CherryPickPlan.load()
+
+    if plan is not None and discard_progress:
+        plan.discard()
+        plan = None
+
+    if plan is not None:
+        if milestone is not None and milestone != plan.milestone:
+            sys.stderr.write(
+                'Unfinished cherry pick of milestone {} found. Finish it '
+                'or pass --discard-progress.\n'.format(plan.milestone))
+            sys.exit(1)
+        print('Resuming cherry pick of milestone', plan.milestone)
 
-    if milestone is None:
-        gh_milestone = github.get_latest_version_milestone(repo)
-        print('No milestone passed in. Found', gh_milestone.title)
     else:
-        gh_milestone = github.get_milestone_by_title(repo, milestone)
+        if milestone is None:
+            gh_milestone = github.get_latest_version_milestone(repo)
+            print('No milestone passed in. Found', gh_milestone.title)
+        else:
+            gh_milestone = github.get_milestone_by_title(repo, milestone)
+
+        with profiling.phase('git fetch'):
+            git.fetch()
+            # Index the fetched commits
+            pr_index = prindex.PRIndex(cwd=local_repository)
+            index = cherrypick.PatchIdIndex(local_repository)
+
+        with profiling.phase('PR fetch'):
+            pulls = github.get_milestone_prs(repo, gh_milestone.number)
+
+        to_pick = []
 
-    git.fetch()
+        for pull in pulls:
+            if LABEL_CHERRY_PICKED in pull.labels:
+                print("Already cherry picked:", pull.title)
+                continue
 
-    to_pick = []
+            if not pull.merged:
+                print("Not merged yet:", pull.title)
+                continue
 
-    for issue in sorted(
-            repo.issues(milestone=gh_milestone.number, state='closed'),
-            key=lambda issue: issue.number):
-        pull = repo.pull_request(issue.number)
+            # Prefer the local commit, GitHub knows about unfetched ones
+            local = pr_index.commits(pull.number)
+            to_pick.append((pull.number,
+                            local[0] if local else pull.merge_commit_sha,
+                            pull.title))
 
-        if not pull.is_merged():
-            print("Not merged yet:", pull.title)
-            continue
+        applied = index.applied([sha for _, sha, _ in to_pick])
 
-        if any(label.name == LABEL_CHERRY_PICKED for label in issue.labels()):
-            print("Already cherry picked:", pull.title)
-            continue
+        for number, sha, title in to_pick:
+            if sha in applied:
+                print("Already cherry picked without label:", title)
+                label_queue.add(number, LABEL_CHERRY_PICKED)
 
-        to_pick.append((pull, issue))
+        plan = cherrypick.CherryPickPlan.create(
+            gh_milestone.title, local_repository,
+            [entry for entry in to_pick if entry[1] not in applied])
 
-    for pull, issue in to_pick:
-        print("Cherry picking {}: {}".format(
-            pull.title, pull.merge_commit_sha))
-        git.cherry_pick(pull.merge_commit_sha, local_repository)
-        issue.add_labels(LABEL_CHERRY_PICKED)
+    with profiling.phase('cherry pick'):
+        done = plan.run(
+            lambda number: label_queue.add(number, LABEL_CHERRY_PICKED))
+
+    with profiling.phase('label writes'):
+        label_queue.flush()
+
+    if not done:
+        sys.stderr.write(
+            'Cherry picking stopped. Resolve the conflicts, run '
+            'git cherry-pick --continue and run this command again to '
+            'resume.\n')
+        sys.exit(1)
 
 
 @cli.command(help='Mark merged PRs as cherry picked and closes milestone.')
 @click.option('--milestone', default=None)
 def milestone_close(milestone):
+    from . import github
+
     gh_session = github.get_session()
     repo = gh_session.repository('home-assistant', 'home-assistant')
 
@@ -97,56 +270,120 @@ def milestone_close(milestone):
     else:
         gh_milestone = github.get_milestone_by_title(repo, milestone)
 
-    gh_milestone.update(state='closed')
+    github.close_milestone(repo, gh_milestone)
 
 
 @cli.command(help="List the merge commits of a milestone.")
 @click.option('--repository', default='home-assistant')
+@click.option('--local-repository', default=None,
+              help='Local clone of the repository, {} for home-assistant.'
+              .format(HASS_REPO))
 @click.argument('title')
-def milestone_list_commits(repository, title):
+def milestone_list_commits(repository, local_repository, title):
+    from . import github, prindex
+
     gh_session = github.get_session()
     repo = gh_session.repository('home-assistant', repository)
     milestone = github.get_milestone_by_title(repo, title)
 
-    commits = []
+    if local_repository is None and repository == 'home-assistant':
+        local_repository = HASS_REPO
 
-    for issue in sorted(
-            repo.issues(milestone=milestone.number, state='closed'),
-            key=lambda issue: issue.number):
-        pull = repo.pull_request(issue.number)
+    # PR numbers only match commits of a clone of the same repository
+    index = None
+    if local_repository is not None:
+        index = prindex.PRIndex(cwd=local_repository)
+    commits = []
 
-        if pull.is_merged():
-            commits.append(pull.merge_commit_sha)
+    for pull in github.get_milestone_prs(repo, milestone.number):
+        if pull.merged:
+            # Prefer the local commit, GitHub knows about unfetched ones
+            local = index.commits(pull.number) if index is not None else []
+            commits.append(local[0] if local else pull.merge_commit_sha)
 
     print(' '.join(commits))
 
 
+@cli.command(help='List the branches that contain PRs.')
+@click.argument('prs', nargs=-1, type=int)
+def pr_branches(prs):
+    from . import prindex
+
+    index = prindex.PRIndex()
+
+    for pr in prs:
+        print('#{}: {}'.format(pr, ', '.join(index.branches(pr)) or '-'))
+
+
 @cli.command(help='Find unmerged documentation PRs.')
 @click.option('--branch', default='rc')
 @click.argument('release')
 def unmerged_docs(branch, release):
-    docs_pr_ptrn = re.compile('home-assistant/home-assistant.github.io#(\d+)')
+    from . import github, model
+
+    docs_pr_ptrn = re.compile(r'home-assistant/home-assistant\.github\.io#(\d+)')
     gh_session = github.get_session()
     repo = gh_session.repository('home-assistant', 'home-assistant')
     docs_repo = gh_session.repository('home-assistant', 'home-assistant.github.io')
     release = model.Release(release, branch=branch)
-    prs = model.PRCache(repo)
-    doc_prs = model.PRCache(docs_repo)
-
-    for line in release.log_lines():
-        if line.pr is None:
-            continue
-
-        pr = prs.get(line.pr)
-        match = docs_pr_ptrn.search(pr.body_text)
-        if not match:
-            continue
-
-        docs_pr = doc_prs.get(match.groups()[0])
-
-        if docs_pr.state == 'closed':
-            continue
-
-        print(pr.title)
-        print(docs_pr.html_url)
-        print()
+    store = pr_store()
+    prs = model.PRCache(repo, store)
+    doc_prs = model.PRCache(docs_repo, store)
+
+    with profiling.phase('PR fetch'):
+        numbers = release.pr_numbers()
+        prefetch(prs, numbers)
+        docs_refs = [
+            (pr, sorted(set(int(ref) for ref in
+                            docs_pr_ptrn.findall(pr.body_text))))
+            for pr in prs.get_many(numbers)]
+
+    def check(batch):
+        doc_prs.prefetch(batch)
+        return batch
+
+    docs_numbers = sorted(set(
+        number for _, refs in docs_refs for number in refs))
+    size = model.PREFETCH_BATCH_SIZE
+    pending = [(pr, refs) for pr, refs in docs_refs if refs]
+    loaded = set()
+    unmerged = 0
+
+    # Docs PRs load in bulk batches at once, a PR is reported as soon as
+    # all docs PRs it references are in
+    with ThreadPoolExecutor(max_workers=model.FETCH_WORKERS) as executor:
+        futures = [executor.submit(check, docs_numbers[start:start + size])
+                   for start in range(0, len(docs_numbers), size)]
+
+        for future in as_completed(futures):
+            loaded.update(future.result())
+            ready = [(pr, refs) for pr, refs in pending
+                     if loaded.issuperset(refs)]
+            pending = [(pr, refs) for pr, refs in pending
+                       if not loaded.issuperset(refs)]
+
+            for pr, refs in ready:
+                # Whatever GraphQL could not resolve is fetched over REST
+                open_docs = [docs_pr for docs_pr in map(doc_prs.get, refs)
+                             if docs_pr.state != 'closed']
+
+                if not open_docs:
+                    continue
+
+                unmerged += len(open_docs)
+                print(pr.title)
+                for docs_pr in open_docs:
+                    print(docs_pr.html_url)
+                print(flush=True)
+
+    print('Found {} unmerged docs PRs. {} of {} PRs reference docs.'.format(
+        unmerged, sum(1 for _, refs in docs_refs if refs), len(docs_refs)))
+
+
+@cli.command(help='Remove all cached PRs and API responses.')
+def clear_cache():
+    from . import cache, httpcache
+
+    print('Removed {} cached PRs'.format(cache.PRStore().clear()))
+    print('Removed {} cached responses'.format(
+        httpcache.HTTPCache().clear()))
@@ -1,5 +1,28 @@
 TOKEN_FILE = '.token'
+TOKEN_CHECK_FILE = 'data/token-check.json'
+# Seconds a token found valid is used without testing it again.
+TOKEN_CHECK_TTL = 24 * 60 * 60
+HASS_REPO = '../home-assistant'
 USERS_FILE = 'data/users.csv'
 NOTES_FILE = 'notes.txt'
 GH_NO_EMAIL_SUFFIX = '@users.noreply.github.com'
 LABEL_CHERRY_PICKED = 'cherry-picked'
+CACHE_FILE = 'data/cache.db'
+# Cached PRs younger than this are used without asking GitHub.
+PR_CACHE_TTL = 60 * 60
+# Cached PRs not revalidated for this long are evicted.
+PR_CACHE_MAX_AGE = 30 * 24 * 60 * 60
+HTTP_CACHE_FILE = 'data/http-cache.db'
+# Cached responses not revalidated for this long are evicted.
+HTTP_CACHE_MAX_AGE = 7 * 24 * 60 * 60
+CHERRY_PICK_JOURNAL = 'data/cherry-pick.json'
+PATCH_ID_INDEX = 'data/patch-ids.json'
+PR_INDEX = 'data/pr-index.json'
+# Branches of the HASS repository whose PRs are indexed locally.
+INDEXED_REFS = ('origin/dev', 'origin/master', 'origin/rc')
+PENDING_LABELS = 'data/pending-labels.json'
+MILESTONE_INDEX = 'data/milestones.json'
+# Seconds the milestone index is used before revalidating it.
+MILESTONE_INDEX_TTL = 10 * 60
+# Seconds before an email nobody could resolve is tried again.
+USERS_NEGATIVE_TTL = 7 * 24 * 60 * 60
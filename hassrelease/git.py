@@ -1,80 +1,321 @@
+import ast
+import atexit
 import subprocess
 import sys
 
+from .const import HASS_REPO
+
+# Fields of a commit in the log, separated by the ASCII unit separator.
+LOG_FORMAT = '%H%x1f%P%x1f%ae%x1f%s'
+READ_SIZE = 64 * 1024
+
+
+class CatFile:
+    """A long running 'git cat-file --batch' process reading objects."""
+
+    def __init__(self, cwd=HASS_REPO):
+        self.process = subprocess.Popen(
+            ['git', 'cat-file', '--batch'],
+            cwd=cwd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL
+        )
+
+    def read(self, rev):
+        """Return tuple (sha, type, content) of an object or None."""
+        self.process.stdin.write(rev.encode('utf-8') + b'\n')
+        self.process.stdin.flush()
+        header = self.process.stdout.readline().split()
+
+        # Missing and ambiguous objects report '<rev> missing'
+        if len(header) != 3:
+            if not header:
+                raise OSError('git cat-file exited')
+            return None
+
+        sha, kind, size = header
+        content = self.process.stdout.read(int(size))
+        # Skip the newline terminating the content
+        self.process.stdout.read(1)
+        return sha.decode('utf-8'), kind.decode('utf-8'), content
+
+    def close(self):
+        self.process.stdin.close()
+        self.process.wait()
+
+
+_CAT_FILES = {}
+
+
+def cat_file(cwd=HASS_REPO):
+    """Return the shared CatFile process of a repository."""
+    if cwd not in _CAT_FILES:
+        _CAT_FILES[cwd] = CatFile(cwd)
+        atexit.register(_CAT_FILES[cwd].close)
+
+    return _CAT_FILES[cwd]
+
+
+def _evaluate(node, names):
+    """Evaluate constants, names, + and string formatting."""
+    if isinstance(node, ast.Name):
+        if node.id not in names:
+            raise ValueError(node.id)
+        return names[node.id]
+
+    if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Add):
+        return _evaluate(node.left, names) + _evaluate(node.right, names)
+
+    if isinstance(node, ast.JoinedStr):
+        return ''.join(
+            format(_evaluate(value.value, names))
+            if isinstance(value, ast.FormattedValue)
+            else _evaluate(value, names)
+            for value in node.values)
+
+    if (isinstance(node, ast.Call) and
+            isinstance(node.func, ast.Attribute) and
+            node.func.attr == 'format'):
+        return _evaluate(node.func.value, names).format(
+            *(_evaluate(arg, names) for arg in node.args),
+            **{kw.arg: _evaluate(kw.value, names) for kw in node.keywords})
+
+    return ast.literal_eval(node)
+
+
+def parse_version(source):
+    """Get __version__ of a Python module without executing it."""
+    names = {}
+
+    for node in ast.parse(source).body:
+        if not (isinstance(node, ast.Assign) and len(node.targets) == 1 and
+                isinstance(node.targets[0], ast.Name)):
+            continue
+
+        try:
+            names[node.targets[0].id] = _evaluate(node.value, names)
+        except (ValueError, TypeError, AttributeError):
+            continue
+
+    return names['__version__']
+
 
 def get_hass_version(branch):
     """Get the HA version of a branch."""
-    process = subprocess.run(
-        "git show {branch}:homeassistant/const.py".format(branch=branch),
-        shell=True,
-        cwd='../home-assistant',
-        stdout=subprocess.PIPE,
-        stderr=subprocess.DEVNULL
-    )
-
-    if process.returncode != 0:
+    try:
+        obj = cat_file().read('{}:homeassistant/const.py'.format(branch))
+        return parse_version(obj[2])
+    except (OSError, TypeError, KeyError, SyntaxError):
         sys.stderr.write("Failed getting HASS version of branch\n")
         sys.stderr.write(
-            "Does home-assistant repo exist at ../home-assistant?\n")
+            "Does home-assistant repo exist at {}?\n".format(HASS_REPO))
         sys.stderr.write("Does branch {} exist?\n".format(branch))
         sys.exit(1)
 
-    locals = {}
-    exec(process.stdout, {}, locals)
-    return locals['__version__']
 
+def resolve_ref(ref, cwd=HASS_REPO):
+    """Return the SHA of the commit a ref points at or None if missing."""
+    try:
+        obj = cat_file(cwd).read('{}^{{commit}}'.format(ref))
+    except OSError:
+        return None
 
-def get_log(branch):
+    return None if obj is None else obj[0]
+
+
+def rev_parse(ref, cwd=HASS_REPO):
+    """Get the SHA of the commit a ref points at."""
+    sha = resolve_ref(ref, cwd)
+
+    if sha is None:
+        sys.stderr.write("Failed resolving {}\n".format(ref))
+        sys.stderr.write(
+            "Does home-assistant repo exist at {}?\n".format(cwd))
+        sys.exit(1)
+
+    return sha
+
+
+def is_ancestor(ancestor, ref, cwd=HASS_REPO):
+    """Return if commit ancestor is reachable from ref."""
     process = subprocess.run(
-        "git log origin/master...{branch} "
-        "--pretty=format:'- %s (%ae)' --reverse".format(branch=branch),
-        shell=True,
-        cwd='../home-assistant',
+        ['git', 'merge-base', '--is-ancestor', ancestor, ref],
+        cwd=cwd,
+        stderr=subprocess.DEVNULL
+    )
+    return process.returncode == 0
+
+
+def read_records(stream, separator=b'\0', size=READ_SIZE):
+    """Yield the separated records of a binary stream as they arrive."""
+    buffer = b''
+
+    for chunk in iter(lambda: stream.read1(size), b''):
+        buffer += chunk
+        *records, buffer = buffer.split(separator)
+        yield from records
+
+    if buffer:
+        yield buffer
+
+
+def get_log(branch, since=None):
+    """Stream the log of a branch, oldest first.
+
+    Yields tuples (sha, parent shas, author email, subject).
+
+    since: only include commits after this commit instead of all commits
+    not on origin/master.
+    """
+    if since is None:
+        revisions = "origin/master...{}".format(branch)
+    else:
+        revisions = "{}..{}".format(since, branch)
+
+    process = subprocess.Popen(
+        ['git', 'log', '-z', '--reverse', '--pretty=format:' + LOG_FORMAT,
+         revisions],
+        cwd=HASS_REPO,
         stdout=subprocess.PIPE,
         stderr=subprocess.DEVNULL
     )
+    last = None
 
-    if process.returncode != 0:
+    try:
+        for record in read_records(process.stdout):
+            sha, parents, email, subject = \
+                record.decode('utf-8').split('\x1f')
+            # Filter out duplicate lines (I don't git very well)
+            if (email, subject) == last:
+                continue
+            last = email, subject
+            yield sha, parents.split(), email, subject
+    except GeneratorExit:
+        # Stopped reading early
+        process.kill()
+        process.wait()
+        raise
+    finally:
+        process.stdout.close()
+
+    if process.wait() != 0:
         sys.stderr.write("Failed getting log\n")
         sys.stderr.write(
-            "Does home-assistant repo exist at ../home-assistant?\n")
+            "Does home-assistant repo exist at {}?\n".format(HASS_REPO))
         sys.stderr.write("Does branch {} exist?\n".format(branch))
         sys.exit(1)
 
-    output = process.stdout.decode('utf-8')
-    last = None
 
-    for line in output.split('\n'):
-        # Filter out duplicate lines (I don't git very well)
-        if line == last:
-            continue
-        last = line
-        yield line
+def log_subjects(revisions, cwd=HASS_REPO, *, reverse=False):
+    """Stream (sha, subject) of the commits of revisions, newest first.
+
+    Oldest first if reverse, which git only starts streaming once it has
+    walked all revisions.
+    """
+    process = subprocess.Popen(
+        ['git', 'log', '-z', '--pretty=format:%H%x1f%s'] +
+        (['--reverse'] if reverse else []) + [revisions],
+        cwd=cwd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL
+    )
+
+    with process.stdout:
+        for record in read_records(process.stdout):
+            yield tuple(record.decode('utf-8').split('\x1f', 1))
+
+    if process.wait() != 0:
+        sys.stderr.write("Failed getting log of {}\n".format(revisions))
+        sys.exit(1)
 
 
 def fetch():
     process = subprocess.run(
         "git fetch",
         shell=True,
-        cwd='../home-assistant'
+        cwd=HASS_REPO
     )
 
     if process.returncode != 0:
         sys.stderr.write("Updating Home Assistant repo failed\n")
         sys.stderr.write(
-            "Does home-assistant repo exist at ../home-assistant?\n")
+            "Does home-assistant repo exist at {}?\n".format(HASS_REPO))
         sys.exit(1)
 
 
-def cherry_pick(sha, cwd='../home-assistant'):
+def cherry_pick(shas, cwd=HASS_REPO):
+    """Cherry pick commits in order in a single git invocation.
+
+    Returns if all commits were applied. On a conflict git stops and
+    leaves the cherry pick in progress.
+    """
+    process = subprocess.run(['git', 'cherry-pick'] + list(shas), cwd=cwd)
+    return process.returncode == 0
+
+
+def cherry_pick_in_progress(cwd=HASS_REPO):
+    """Return if a cherry pick waits for conflicts to be resolved."""
+    return resolve_ref('CHERRY_PICK_HEAD', cwd) is not None
+
+
+def _commit_keys(args, cwd):
+    """Get (author date, author email, subject) of commits by SHA."""
     process = subprocess.run(
-        "git cherry-pick {}".format(sha),
-        shell=True,
-        cwd=cwd
+        ['git', 'log', '-z', '--pretty=format:%H%x1f%at%x1f%ae%x1f%s'] + args,
+        cwd=cwd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL
     )
+    keys = {}
 
-    if process.returncode != 0:
-        sys.stderr.write("Cherry picking {} failed\n".format(sha))
+    for record in process.stdout.split(b'\0'):
+        if record:
+            sha, *key = record.decode('utf-8').split('\x1f')
+            keys[sha] = tuple(key)
+
+    return keys
+
+
+def applied_commits(shas, since, cwd=HASS_REPO):
+    """Return which commits have been cherry picked on top of since.
+
+    Cherry picks keep author, date and subject, which identifies them
+    however the cherry pick was completed.
+    """
+    if not shas:
+        return set()
+
+    picked = set(_commit_keys(['{}..HEAD'.format(since)], cwd).values())
+    return set(sha for sha, key in
+               _commit_keys(['--no-walk=unsorted'] + list(shas), cwd).items()
+               if key in picked)
+
+
+def patch_ids(args, cwd=HASS_REPO):
+    """Map stable patch ids to SHAs of the commits git log args selects.
+
+    Commits without changes, like merges, have no patch id.
+    """
+    log = subprocess.Popen(
+        ['git', 'log', '-p', '--no-color', '--no-merges'] + args,
+        cwd=cwd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL
+    )
+    process = subprocess.run(
+        ['git', 'patch-id', '--stable'],
+        cwd=cwd,
+        stdin=log.stdout,
+        stdout=subprocess.PIPE
+    )
+    log.stdout.close()
+
+    if log.wait() != 0 or process.returncode != 0:
+        sys.stderr.write("Failed computing patch ids\n")
         sys.stderr.write(
-            "Does home-assistant repo exist at ../home-assistant?\n")
+            "Does home-assistant repo exist at {}?\n".format(cwd))
         sys.exit(1)
+
+    return dict(line.split() for line in
+                process.stdout.decode('utf-8').splitlines())
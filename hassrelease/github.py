@@ -1,15 +1,74 @@
-from distutils.version import StrictVersion
+from collections import namedtuple
+import hashlib
+import json
 import os
 import sys
+import time
 
-from github3 import GitHub
-from github3.exceptions import GitHubError
+import click
+from requests.exceptions import ConnectionError, HTTPError, Timeout
 
-from .const import TOKEN_FILE
+from .const import (
+    MILESTONE_INDEX, TOKEN_CHECK_FILE, TOKEN_CHECK_TTL, TOKEN_FILE)
+from .ratelimit import MAX_CONCURRENCY, RateLimiter
+
+MILESTONE_PRS_QUERY = """
+query($owner: String!, $name: String!, $number: Int!, $cursor: String) {
+  repository(owner: $owner, name: $name) {
+    milestone(number: $number) {
+      pullRequests(first: 100, after: $cursor, states: [CLOSED, MERGED],
+                   orderBy: {field: CREATED_AT, direction: ASC}) {
+        pageInfo { hasNextPage endCursor }
+        nodes {
+          number title merged mergeCommit { oid }
+          labels(first: 100) { nodes { name } }
+        }
+      }
+    }
+  }
+}
+"""
+
+COMMIT_AUTHORS_QUERY = """
+query($owner: String!, $name: String!) {
+  repository(owner: $owner, name: $name) { %s }
+}
+"""
+COMMIT_AUTHOR_ALIAS = """
+c%(sha)s: object(oid: "%(sha)s") {
+  ... on Commit { author { user { login } } }
+}
+"""
+# Number of commits looked up per GraphQL query.
+COMMIT_AUTHORS_BATCH_SIZE = 100
+
+MilestonePR = namedtuple(
+    'MilestonePR', 'number title merged merge_commit_sha labels')
+
+
+class GraphQLError(Exception):
+    """A GraphQL query that GitHub could not answer."""
 
 
 def get_session():
     """Fetch and/or load API authorization token for GITHUB."""
+    options = _options()
+
+    # github3.py is slow to import, only commands talking to GitHub need it
+    from github3 import GitHub
+    from github3.exceptions import GitHubError
+    from requests.adapters import HTTPAdapter
+    from .httpcache import HTTPCache
+    from .monkeypatch import patch
+    from .recording import Recorder, Replayer
+
+    patch()
+
+    if options.get('replay'):
+        gh = GitHub()
+        Replayer(options['replay']).install(gh.session)
+        return gh
+
     if not os.path.isfile(TOKEN_FILE):
         sys.stderr.write('Please write a GitHub token to .token\n')
         sys.exit(1)
@@ -18,41 +77,216 @@ def get_session():
         token = fd.readline().strip()
 
     gh = GitHub(token=token)
+    # The session keeps connections alive and asks for gzip. Keep one
+    # connection per request the limiter lets through at once.
+    gh.session.mount('https://', HTTPAdapter(pool_maxsize=MAX_CONCURRENCY))
+    limiter = RateLimiter()
+    limiter.install(gh.session)
+    if options.get('record'):
+        Recorder(options['record']).install(gh.session)
+    else:
+        # Fresh cached responses do not count against the limiter
+        HTTPCache().install(gh.session)
+
+    ctx = click.get_current_context(silent=True)
+    if ctx is not None:
+        ctx.call_on_close(limiter.print_stats)
+
+    if token_checked(token):
+        return gh
+
     try:  # Test connection before starting
         gh.is_starred('github', 'gitignore')
-        return gh
     except GitHubError as exc:
         sys.stderr.write('Invalid token found\n')
         sys.exit(1)
 
+    save_token_check(token)
+    return gh
+
+
+def _options():
+    """Return the options passed to hassrelease before the command."""
+    ctx = click.get_current_context(silent=True)
+    return ctx.find_root().params if ctx is not None else {}
+
+
+def persistent_caches():
+    """Return if local caches may serve and store GitHub data.
+
+    Not while recording or replaying. A recording has to hold every
+    response the command needs, whatever earlier runs left behind.
+    """
+    options = _options()
+    return not (options.get('record') or options.get('replay'))
+
+
+def _milestone_index(repo):
+    from .milestones import MilestoneIndex
+
+    return MilestoneIndex(
+        repo, path=MILESTONE_INDEX if persistent_caches() else None)
+
+
+def _token_hash(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def token_checked(token, path=TOKEN_CHECK_FILE, ttl=TOKEN_CHECK_TTL):
+    """Return if the token was found valid less than ttl seconds ago."""
+    try:
+        with open(path, 'rt') as inp:
+            check = json.load(inp)
+    except (OSError, ValueError):
+        return False
+
+    return (check.get('token') == _token_hash(token) and
+            time.time() - check.get('checked', 0) < ttl)
+
+
+def save_token_check(token, path=TOKEN_CHECK_FILE):
+    """Remember that the token was found valid."""
+    with open(path, 'wt') as outp:
+        json.dump({'token': _token_hash(token), 'checked': time.time()},
+                  outp)
+
+
+def is_transient(exc):
+    """Return if a failed request may succeed when tried again."""
+    if isinstance(exc, HTTPError):
+        return (exc.response is not None and
+                exc.response.status_code >= 500)
+
+    return isinstance(exc, (ConnectionError, Timeout))
+
+
+def repo_key(repo):
+    """Return 'owner/name' of a github3 repository."""
+    return '/'.join(repo._api.rstrip('/').split('/')[-2:])
+
+
+def graphql_url(api_url):
+    """Return the GraphQL endpoint serving a REST API url."""
+    if api_url.startswith('https://api.github.com/'):
+        return 'https://api.github.com/graphql'
+
+    base = api_url.split('/repos/')[0].rstrip('/')
+
+    if base.endswith('/api/v3'):
+        # GitHub Enterprise
+        return base[:-len('/v3')] + '/graphql'
+
+    return base + '/graphql'
+
+
+def graphql(session, url, query, **variables):
+    """Run a GraphQL query and return its data.
+
+    Errors of single fields, like PRs that do not exist, leave them null.
+    Queries that failed as a whole raise GraphQLError.
+    """
+    resp = session.post(url, json={'query': query, 'variables': variables})
+    resp.raise_for_status()
+    result = resp.json()
+    data = result.get('data')
+
+    if result.get('errors') and (data is None or None in data.values()):
+        raise GraphQLError('; '.join(
+            error.get('message', 'Unknown error')
+            for error in result['errors']))
+
+    return data or {}
+
+
+def add_labels(repo, number, *labels):
+    """Add labels to an issue or PR without fetching it first."""
+    resp = repo.session.post(
+        '{}/issues/{}/labels'.format(repo._api, number), json=list(labels))
+    resp.raise_for_status()
+
+
+def get_commit_authors(repo, shas, *, batch_size=COMMIT_AUTHORS_BATCH_SIZE):
+    """Fetch the GitHub logins of the authors of commits.
+
+    Returns a dict of SHA to login, without commits whose author email is
+    not linked to a GitHub account.
+    """
+    owner, name = repo_key(repo).split('/')
+    url = graphql_url(repo._api)
+    shas = sorted(set(shas))
+    logins = {}
+
+    for start in range(0, len(shas), batch_size):
+        query = COMMIT_AUTHORS_QUERY % ''.join(
+            COMMIT_AUTHOR_ALIAS % {'sha': sha}
+            for sha in shas[start:start + batch_size])
+        data = graphql(repo.session, url, query, owner=owner, name=name)
+
+        for alias, commit in (data.get('repository') or {}).items():
+            user = ((commit or {}).get('author') or {}).get('user')
+            if user:
+                logins[alias[1:]] = user['login']
+
+    return logins
+
+
+def get_milestone_prs(repo, number):
+    """Fetch the closed PRs of a milestone, sorted by number.
+
+    Merged state, merge commit and labels come with the listing, 100 PRs
+    per request.
+    """
+    owner, name = repo_key(repo).split('/')
+    url = graphql_url(repo._api)
+    prs = []
+    cursor = None
+
+    while True:
+        data = graphql(repo.session, url, MILESTONE_PRS_QUERY, owner=owner,
+                       name=name, number=number, cursor=cursor)
+        page = data['repository']['milestone']['pullRequests']
+
+        for node in page['nodes']:
+            prs.append(MilestonePR(
+                node['number'], node['title'], node['merged'],
+                (node.get('mergeCommit') or {}).get('oid'),
+                [label['name'] for label in node['labels']['nodes']]))
+
+        if not page['pageInfo']['hasNextPage']:
+            return sorted(prs)
+
+        cursor = page['pageInfo']['endCursor']
+
 
 def get_milestone_by_title(repo, title):
     """Fetch milestone by title."""
-    seen = []
-    for ms in repo.milestones(state='open'):
-        if ms.title == title:
-            return ms
+    index = _milestone_index(repo)
+    milestone = index.by_title(title)
 
-        seen.append(ms.title)
+    if milestone is not None:
+        return milestone
 
     sys.stderr.write(
         'Milestone {} not found. Open milestones: {}\n'.format(
-            title, ', '.join(seen)))
+            title, ', '.join(index.open_titles())))
     sys.exit(1)
 
 
 def get_latest_version_milestone(repo):
-    """Fetch milestone by title."""
-    milestones = []
-
-    for ms in repo.milestones(state='open'):
-        try:
-            milestones.append((StrictVersion(ms.title), ms))
-        except ValueError:
-            print('Found milestone with invalid version', ms.title)
+    """Fetch the open milestone with the highest version."""
+    milestone = _milestone_index(repo).latest_version()
 
-    if not milestones:
+    if milestone is None:
         sys.stderr.write('No milestones found\n')
         sys.exit(1)
 
-    return list(reversed(sorted(milestones)))[0][1]
+    return milestone
+
+
+def close_milestone(repo, milestone):
+    """Close a milestone without fetching it first."""
+    resp = repo.session.patch(
+        '{}/milestones/{}'.format(repo._api, milestone.number),
+        json={'state': 'closed'})
+    resp.raise_for_status()
+    _milestone_index(repo).expire()
@@ -0,0 +1,148 @@
+from http.client import responses as HTTP_REASONS
+import json
+import re
+import sqlite3
+import threading
+import time
+
+from requests import Response
+from requests.structures import CaseInsensitiveDict
+
+from .const import HTTP_CACHE_FILE, HTTP_CACHE_MAX_AGE
+from .profiling import count
+from .util import SessionMiddleware
+
+# Response headers kept with a cached body. Link drives pagination.
+STORED_HEADERS = ('Content-Type', 'ETag', 'Last-Modified', 'Link',
+                  'Cache-Control')
+MAX_AGE_PTRN = re.compile(r'max-age=(\d+)')
+
+
+class HTTPCache(SessionMiddleware):
+    """Private HTTP cache of GET responses, shared by all repositories.
+
+    Fresh responses are served without a request. Stale ones are
+    revalidated with If-None-Match/If-Modified-Since, which GitHub does
+    not count against the rate limit when nothing changed.
+    """
+
+    def __init__(self, path=HTTP_CACHE_FILE, max_age=HTTP_CACHE_MAX_AGE):
+        # Requests come from the worker threads of PRCache and LabelQueue
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            'key TEXT PRIMARY KEY, headers TEXT NOT NULL, body BLOB NOT NULL, '
+            'expires REAL NOT NULL, fetched_at REAL NOT NULL)')
+        self.prune(max_age)
+
+    def request(self, send, method, url, **kwargs):
+        headers = dict(kwargs.get('headers') or {})
+
+        # Callers doing their own revalidation get the raw response
+        if (method.upper() != 'GET' or 'If-None-Match' in headers or
+                'If-Modified-Since' in headers):
+            return send(method, url, **kwargs)
+
+        key = json.dumps([url, kwargs.get('params'), headers.get('Accept')],
+                         sort_keys=True)
+        cached = self.get(key)
+
+        if cached is not None:
+            stored, body, expires = cached
+
+            if expires > time.time():
+                count('http_cache.fresh')
+                return make_response(url, 200, stored, body)
+
+            if 'ETag' in stored:
+                headers['If-None-Match'] = stored['ETag']
+            if 'Last-Modified' in stored:
+                headers['If-Modified-Since'] = stored['Last-Modified']
+            kwargs['headers'] = headers
+
+        resp = send(method, url, **kwargs)
+
+        if resp.status_code == 304 and cached is not None:
+            count('http_cache.revalidated')
+            self.touch(key, _expires(resp.headers))
+            return make_response(url, 200, stored, body)
+
+        if resp.status_code == 200:
+            count('http_cache.miss')
+            self.put(key, resp)
+
+        return resp
+
+    def get(self, key):
+        """Return (headers, body, expires) of a cached response or None."""
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT headers, body, expires FROM responses WHERE key = ?',
+                (key,)).fetchone()
+
+        if row is None:
+            return None
+
+        return json.loads(row[0]), row[1], row[2]
+
+    def put(self, key, resp):
+        """Store a response if it may be cached."""
+        cache_control = resp.headers.get('Cache-Control', '')
+
+        if 'no-store' in cache_control or not (
+                'ETag' in resp.headers or 'Last-Modified' in resp.headers or
+                'max-age' in cache_control):
+            return
+
+        stored = {name: resp.headers[name] for name in STORED_HEADERS
+                  if name in resp.headers}
+
+        with self.lock, self.conn:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)',
+                (key, json.dumps(stored), resp.content,
+                 _expires(resp.headers), time.time()))
+
+    def touch(self, key, expires):
+        """Mark a cached response as revalidated."""
+        with self.lock, self.conn:
+            self.conn.execute(
+                'UPDATE responses SET expires = ?, fetched_at = ? '
+                'WHERE key = ?', (expires, time.time(), key))
+
+    def prune(self, max_age=HTTP_CACHE_MAX_AGE):
+        """Evict responses that have not been revalidated for max_age."""
+        with self.lock, self.conn:
+            return self.conn.execute(
+                'DELETE FROM responses WHERE fetched_at < ?',
+                (time.time() - max_age,)).rowcount
+
+    def clear(self):
+        """Remove all cached responses. Returns number removed."""
+        with self.lock, self.conn:
+            return self.conn.execute('DELETE FROM responses').rowcount
+
+
+def make_response(url, status_code, headers, body):
+    """Build a requests response served from disk."""
+    resp = Response()
+    resp.status_code = status_code
+    resp.reason = HTTP_REASONS.get(status_code, '')
+    resp.url = url
+    resp.headers = CaseInsensitiveDict(headers)
+    resp.encoding = 'utf-8'
+    resp._content = body
+    resp.from_cache = True
+    return resp
+
+
+def _expires(headers):
+    """Return until when a response is fresh according to Cache-Control."""
+    cache_control = headers.get('Cache-Control', '')
+    match = MAX_AGE_PTRN.search(cache_control)
+
+    if match is None or 'no-cache' in cache_control:
+        return 0
+
+    return time.time() + int(match.group(1))
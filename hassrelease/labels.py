@@ -0,0 +1,93 @@
+from concurrent.futures import ThreadPoolExecutor
+import json
+import os
+import sys
+import threading
+
+from requests.exceptions import RequestException
+
+from .const import PENDING_LABELS
+from .github import add_labels, is_transient, repo_key
+from .util import atomic_write_json, retry
+
+# Concurrent requests, retries and seconds before the first retry when
+# adding labels.
+LABEL_WORKERS = 4
+LABEL_RETRIES = 3
+LABEL_BACKOFF = 1
+
+
+class LabelQueue:
+    """Add labels to issues in the background.
+
+    Pending additions are written to disk before they are sent and removed
+    once GitHub accepted or permanently rejected them, so additions of a
+    crashed run are applied by the next queue for the same repository.
+    """
+
+    def __init__(self, repo, *, workers=LABEL_WORKERS, path=PENDING_LABELS):
+        self.repo = repo
+        self.key = repo_key(repo)
+        self.path = path
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.futures = []
+        self.pending = []
+        self.rejected = []
+
+        if os.path.isfile(path):
+            with open(path, 'rt') as inp:
+                self.pending = json.load(inp)
+
+        for entry in self.pending:
+            if entry[0] == self.key:
+                self.futures.append(self.executor.submit(self._apply, entry))
+
+    def add(self, number, *labels):
+        """Queue adding labels to an issue or PR."""
+        entry = [self.key, number, list(labels)]
+
+        with self.lock:
+            self.pending.append(entry)
+            self._save()
+
+        self.futures.append(self.executor.submit(self._apply, entry))
+
+    def flush(self):
+        """Wait for all queued additions. Returns number that failed."""
+        self.executor.shutdown(wait=True)
+        failed = sum(1 for future in self.futures if not future.result())
+
+        for (_, number, labels), exc in self.rejected:
+            sys.stderr.write('GitHub rejected adding {} to #{}: {}\n'.format(
+                ', '.join(labels), number, exc))
+
+        if failed:
+            sys.stderr.write(
+                'Failed adding {} labels, they will be retried on the next '
+                'run\n'.format(failed))
+
+        return failed
+
+    def _apply(self, entry):
+        _, number, labels = entry
+
+        try:
+            retry(lambda: add_labels(self.repo, number, *labels),
+                  retries=LABEL_RETRIES, backoff=LABEL_BACKOFF,
+                  retry_on=is_transient)
+        except RequestException as exc:
+            if is_transient(exc):
+                return False
+            # Trying again on the next run would fail the same way
+            with self.lock:
+                self.rejected.append((entry, exc))
+
+        with self.lock:
+            self.pending.remove(entry)
+            self._save()
+
+        return True
+
+    def _save(self):
+        atomic_write_json(self.path, self.pending)
@@ -0,0 +1,149 @@
+from collections import namedtuple
+from distutils.version import StrictVersion
+import json
+import os
+import re
+import time
+
+from .const import MILESTONE_INDEX, MILESTONE_INDEX_TTL
+from .github import repo_key
+from .util import atomic_write_json
+
+Milestone = namedtuple('Milestone', 'number title state')
+
+# Milestones listed per request, the most GitHub allows.
+PAGE_SIZE = 100
+NEXT_PAGE_PTRN = re.compile(r'<([^>]+)>;\s*rel="next"')
+
+
+class MilestoneIndex:
+    """Local index of the open and closed milestones of a repository.
+
+    Stored in data/milestones.json, or only in memory if path is None.
+    Once older than ttl seconds, every page of the listing is revalidated
+    with a conditional request.
+    """
+
+    def __init__(self, repo, *, path=MILESTONE_INDEX, ttl=MILESTONE_INDEX_TTL):
+        self.repo = repo
+        self.key = repo_key(repo)
+        self.path = path
+        self.ttl = ttl
+        self.data = {}
+        self.updated = False
+        self.titles = None
+
+        if path is not None and os.path.isfile(path):
+            with open(path, 'rt') as inp:
+                self.data = json.load(inp)
+
+    def by_title(self, title):
+        """Return the milestone with a title or None."""
+        milestone = self._titles().get(title)
+
+        # Might have been created since the index was updated
+        if milestone is None and not self.updated:
+            self.update()
+            milestone = self._titles().get(title)
+
+        return milestone
+
+    def latest_version(self):
+        """Return the open milestone with the highest version or None."""
+        latest = self._entry()['latest']
+        return None if latest is None else self._titles()[latest]
+
+    def open_titles(self):
+        return [milestone.title for milestone in self._titles().values()
+                if milestone.state == 'open']
+
+    def expire(self):
+        """Revalidate the index on next use, after changing a milestone."""
+        if self.key in self.data:
+            self.data[self.key]['fetched_at'] = 0
+            self._write()
+
+    def update(self):
+        """Fetch the milestones, keeping pages that did not change."""
+        old_pages = self.data.get(self.key, {}).get('pages', [])
+        url = '{}/milestones'.format(self.repo._api)
+        params = {'state': 'all', 'per_page': PAGE_SIZE}
+        pages = []
+
+        while url is not None:
+            old = None
+            if len(pages) < len(old_pages):
+                old = old_pages[len(pages)]
+            headers = {}
+
+            if old is not None and old['etag']:
+                headers['If-None-Match'] = old['etag']
+
+            resp = self.repo.session.get(url, params=params, headers=headers)
+            # Links to the next pages include the parameters
+            params = None
+
+            if resp.status_code == 304 and old is not None:
+                pages.append(old)
+                url = old['next']
+                continue
+
+            resp.raise_for_status()
+            match = NEXT_PAGE_PTRN.search(resp.headers.get('Link', ''))
+            url = match.group(1) if match else None
+            pages.append({
+                'etag': resp.headers.get('ETag'),
+                'next': url,
+                'milestones': [[ms['number'], ms['title'], ms['state']]
+                               for ms in resp.json()],
+            })
+
+        self.data[self.key] = {
+            'fetched_at': time.time(),
+            'pages': pages,
+            'latest': _latest_version(pages),
+        }
+        self.updated = True
+        self.titles = None
+        self._write()
+
+    def _entry(self):
+        entry = self.data.get(self.key)
+
+        stale = (entry is None or
+                 time.time() - entry['fetched_at'] >= self.ttl)
+
+        if stale and not self.updated:
+            self.update()
+            entry = self.data[self.key]
+
+        return entry
+
+    def _titles(self):
+        if self.titles is None:
+            self.titles = {
+                title: Milestone(number, title, state)
+                for page in self._entry()['pages']
+                for number, title, state in page['milestones']}
+
+        return self.titles
+
+    def _write(self):
+        if self.path is not None:
+            atomic_write_json(self.path, self.data)
+
+
+def _latest_version(pages):
+    """Return the title of the open milestone with the highest version."""
+    versions = []
+
+    for page in pages:
+        for _, title, state in page['milestones']:
+            if state != 'open':
+                continue
+            try:
+                versions.append((StrictVersion(title), title))
+            except ValueError:
+                print('Found milestone with invalid version', title)
+
+    return max(versions)[1] if versions else None
@@ -1,57 +1,327 @@
+from concurrent.futures import ThreadPoolExecutor
 from distutils.version import StrictVersion
 import re
+import sys
+import time
 
-from .git import get_log
-from .const import GH_NO_EMAIL_SUFFIX
+from requests.exceptions import HTTPError
+
+from .git import get_log, is_ancestor, rev_parse
+from .github import graphql, graphql_url, is_transient, repo_key
+from .const import GH_NO_EMAIL_SUFFIX, PR_CACHE_TTL
+from .profiling import count
+from .util import retry
+
+# Bumped whenever the checkpoint format changes.
+CHECKPOINT_VERSION = 2
+ACCEPT_FULL = 'application/vnd.github.v3.full+json'
+# Concurrent requests, seconds per request, retries and seconds before
+# the first retry when fetching PRs.
+FETCH_WORKERS = 8
+FETCH_TIMEOUT = 10
+FETCH_RETRIES = 3
+FETCH_BACKOFF = 0.5
+# Number of PRs requested per GraphQL query when prefetching.
+PREFETCH_BATCH_SIZE = 50
+PREFETCH_FIELDS = """
+number title state url bodyText author { login }
+labels(first: 100) { nodes { name } } milestone { title }
+"""
+PREFETCH_QUERY = """
+query($owner: String!, $name: String!) {
+  repository(owner: $owner, name: $name) { %s }
+}
+"""
+PREFETCH_ALIAS = """
+pr%(number)d: issueOrPullRequest(number: %(number)d) {
+  ... on PullRequest { %(fields)s }
+  ... on Issue { %(fields)s }
+}
+"""
 
 
 class LogLine:
-    PR_PATTERN = re.compile('\(#(\d+)\)')
+    PR_PATTERN = re.compile(r'\(#(\d+)\)$')
 
-    def __init__(self, line):
-        # Strip off the '-' at the start
-        parts = line.split()[1:]
+    __slots__ = ('sha', 'parents', 'email', 'subject', 'pr', '_message_end')
 
-        self.line = line
-        self.email = parts.pop()[1:-1]
+    def __init__(self, sha, parents, email, subject):
+        # Interned so that parents share the strings of earlier commits
+        self.sha = sys.intern(sha)
+        self.parents = tuple(sys.intern(parent) for parent in parents)
+        self.email = sys.intern(email)
+        self.subject = subject = subject.strip()
 
-        pr_match = self.PR_PATTERN.match(parts[-1])
+        pr_match = self.PR_PATTERN.search(subject)
 
         if pr_match:
-            self.pr = int(pr_match.groups(1)[0])
-            parts.pop()
+            self.pr = int(pr_match.group(1))
+            self._message_end = len(subject[:pr_match.start()].rstrip())
         else:
             self.pr = None
+            self._message_end = len(subject)
+
+    @property
+    def message(self):
+        """The subject without the PR number."""
+        return self.subject[:self._message_end]
+
+    @property
+    def line(self):
+        """The commit as shown to users."""
+        return '- {} ({})'.format(self.subject, self.email)
+
+    def as_record(self):
+        return [self.sha, list(self.parents), self.email, self.subject]
+
+
+class PR:
+    """The fields of a GitHub PR that we use."""
+    FIELDS = ('number', 'title', 'state', 'html_url', 'body_text', 'login',
+              'labels', 'milestone')
+
+    __slots__ = FIELDS
 
-        self.message = ' '.join(parts)
+    def __init__(self, data):
+        for field in self.FIELDS:
+            setattr(self, field, data.get(field))
+        self.labels = tuple(self.labels or ())
+
+    @staticmethod
+    def trim_issue(issue):
+        """Reduce issue JSON from the REST API to the fields we use."""
+        milestone = issue.get('milestone')
+        return {
+            'number': issue['number'],
+            'title': issue['title'],
+            'state': issue['state'],
+            'html_url': issue['html_url'],
+            'body_text': issue.get('body_text', issue.get('body')) or '',
+            'login': issue['user']['login'],
+            'labels': [label['name'] for label in issue['labels']],
+            'milestone': milestone['title'] if milestone else None,
+        }
+
+    @staticmethod
+    def trim_node(node):
+        """Reduce a GraphQL issue or PR node to the fields we use."""
+        milestone = node.get('milestone')
+        return {
+            'number': node['number'],
+            'title': node['title'],
+            # GraphQL reports merged PRs as MERGED, REST as closed.
+            'state': 'open' if node['state'] == 'OPEN' else 'closed',
+            'html_url': node['url'],
+            'body_text': node['bodyText'],
+            'login': (node.get('author') or {}).get('login', ''),
+            'labels': [label['name'] for label in node['labels']['nodes']],
+            'milestone': milestone['title'] if milestone else None,
+        }
 
 
 class PRCache:
-    def __init__(self, repo):
+    """PRs of a repository, backed by an optional persistent PRStore.
+
+    Stored PRs older than ttl seconds are refreshed in bulk over GraphQL
+    by prefetch and get_many. PRs fetched one by one over REST are
+    revalidated with a conditional request instead.
+    """
+
+    def __init__(self, repo, store=None, *, ttl=PR_CACHE_TTL):
         self.repo = repo
+        self.store = store
+        self.ttl = ttl
+        self.key = repo_key(repo)
         self.cache = {}
 
     def get(self, pr):
-        if pr not in self.cache:
-            self.cache[pr] = self.repo.issue(pr)
+        pr = int(pr)
+        if pr in self.cache:
+            count('pr_cache.hit')
+        else:
+            self.cache[pr] = self._load(pr)
         return self.cache[pr]
 
+    def _is_fresh(self, pr):
+        if pr in self.cache:
+            return True
+
+        if self.store is None:
+            return False
+
+        cached = self.store.get(self.key, pr)
+        return cached is not None and time.time() - cached[2] < self.ttl
+
+    def prefetch(self, prs, *, batch_size=PREFETCH_BATCH_SIZE):
+        """Bulk load PRs that are not cached using GraphQL.
+
+        Returns tuple (number of PRs loaded, number of requests made).
+        """
+        missing = sorted(set(int(pr) for pr in prs if not self._is_fresh(pr)))
+        owner, name = self.key.split('/')
+        url = graphql_url(self.repo._api)
+        loaded = requests = 0
+
+        for start in range(0, len(missing), batch_size):
+            batch = missing[start:start + batch_size]
+            query = PREFETCH_QUERY % ''.join(
+                PREFETCH_ALIAS % {'number': pr, 'fields': PREFETCH_FIELDS}
+                for pr in batch)
+            data = retry(
+                lambda: graphql(self.repo.session, url, query,
+                                owner=owner, name=name),
+                retries=FETCH_RETRIES, backoff=FETCH_BACKOFF,
+                retry_on=is_transient)
+            requests += 1
+
+            entries = []
+            for node in (data.get('repository') or {}).values():
+                # PRs that failed to resolve are fetched on demand by get
+                if node is None:
+                    continue
+                trimmed = PR.trim_node(node)
+                self.cache[trimmed['number']] = PR(trimmed)
+                entries.append((trimmed['number'], trimmed, None))
+
+            if self.store is not None:
+                self.store.put_many(self.key, entries)
+            loaded += len(entries)
+            count('pr_cache.prefetched', len(entries))
+
+        return loaded, requests
+
+    def get_many(self, prs, *, workers=FETCH_WORKERS, timeout=FETCH_TIMEOUT,
+                 retries=FETCH_RETRIES):
+        """Return PRs in the order given.
+
+        Missing and stale PRs are loaded in bulk, whatever GraphQL cannot
+        resolve is fetched concurrently over REST.
+        """
+        numbers = [int(pr) for pr in prs]
+        self.prefetch(numbers)
+        pending = {}
+
+        for pr in numbers:
+            if pr in self.cache or pr in pending:
+                count('pr_cache.hit')
+                continue
+            cached = self._lookup(pr)
+            if isinstance(cached, PR):
+                self.cache[pr] = cached
+            else:
+                pending[pr] = cached
+
+        if pending:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = {
+                    pr: executor.submit(self._fetch, pr, cached,
+                                        timeout=timeout, retries=retries)
+                    for pr, cached in pending.items()}
+
+            # Store in a fixed order, independent of completion order.
+            for pr in sorted(futures):
+                self.cache[pr] = self._save(pr, pending[pr],
+                                            futures[pr].result())
+
+        return [self.cache[pr] for pr in numbers]
+
+    def _load(self, pr):
+        cached = self._lookup(pr)
+        if isinstance(cached, PR):
+            return cached
+        return self._save(pr, cached, self._fetch(pr, cached))
+
+    def _lookup(self, pr):
+        """Return a fresh PR from the store or the stale entry, if any."""
+        cached = None
+
+        if self.store is not None:
+            cached = self.store.get(self.key, pr)
+
+        if cached is not None and time.time() - cached[2] < self.ttl:
+            count('pr_cache.hit')
+            return PR(cached[0])
+
+        count('pr_cache.miss')
+        return cached
+
+    def _fetch(self, pr, cached, *, timeout=FETCH_TIMEOUT,
+               retries=FETCH_RETRIES):
+        """Request a PR, revalidating the stale entry if there is one.
+
+        Safe to call from worker threads: does not touch the store.
+        """
+        headers = {'Accept': ACCEPT_FULL}
+
+        if cached is not None and cached[1]:
+            headers['If-None-Match'] = cached[1]
+
+        def fetch():
+            resp = self.repo.session.get(
+                '{}/issues/{}'.format(self.repo._api, pr),
+                headers=headers, timeout=timeout)
+            if resp.status_code >= 500:
+                resp.raise_for_status()
+            return resp
+
+        resp = retry(fetch, retries=retries, backoff=FETCH_BACKOFF,
+                     retry_on=is_transient)
+
+        if resp.status_code == 304 and 'If-None-Match' in headers:
+            return None
+
+        if resp.status_code == 304:
+            # Not modified without asking, e.g. from a recording. There is
+            # nothing cached to fall back on, so ask for the full PR.
+            headers['Cache-Control'] = 'no-cache'
+            resp = retry(fetch, retries=retries, backoff=FETCH_BACKOFF,
+                         retry_on=is_transient)
+
+        if resp.status_code == 304:
+            raise HTTPError('GitHub sent no data for PR #{}'.format(pr),
+                            response=resp)
+
+        resp.raise_for_status()
+        return resp
+
+    def _save(self, pr, cached, resp):
+        """Store the result of _fetch and return the PR."""
+        if resp is None:
+            count('pr_cache.revalidated')
+            self.store.touch(self.key, pr)
+            return PR(cached[0])
+
+        data = PR.trim_issue(resp.json())
+
+        if self.store is not None:
+            self.store.put(self.key, pr, data, resp.headers.get('ETag'))
+
+        return PR(data)
+
 
 class Release:
     def __init__(self, version, *, branch):
         self.version = StrictVersion(version)
         self.branch = branch
         self._log_lines = None
+        self._log_stream = None
+        self._by_pr = self._by_email = None
+        self._base = self._head = None
 
-        if self.version.version[-1] == 0 and not self.version.prerelease:
-            vstring = '-'.join(map(str, self.version.version[:2]))
+        if self.version.version[-1] == 0:
+            # Betas share checkpoints with the release they lead up to
+            self.base_identifier = 'release-' + '-'.join(
+                map(str, self.version.version[:2]))
         else:
-            vstring = '-'.join(map(str, self.version.version))
-        self.identifier = 'release-' + vstring
+            self.base_identifier = 'release-' + '-'.join(
+                map(str, self.version.version))
 
         if self.version.prerelease:
             pstring = ''.join(map(str, self.version.prerelease))
-            self.identifier = self.identifier + pstring
+            self.identifier = 'release-{}{}'.format(
+                '-'.join(map(str, self.version.version)), pstring)
+        else:
+            self.identifier = self.base_identifier
 
     @property
     def is_patch_release(self):
@@ -62,22 +332,115 @@ class Release:
         return self.version.version[-1] != 0
 
     def log_lines(self):
+        """Iterate the log lines, reading them from git as needed."""
         if self._log_lines is None:
-            self._log_lines = [LogLine(line) for line in get_log(self.branch)]
-        return self._log_lines
+            self._base = rev_parse('origin/master')
+            self._head = rev_parse(self.branch)
+            self._log_lines = []
+            self._log_stream = get_log(self._head)
+
+        index = 0
+
+        # Serve lines read so far, then continue reading the shared stream.
+        while True:
+            if index < len(self._log_lines):
+                yield self._log_lines[index]
+                index += 1
+                continue
+
+            if self._log_stream is None:
+                return
+
+            record = next(self._log_stream, None)
+
+            if record is None:
+                self._log_stream = None
+                return
+
+            self._log_lines.append(LogLine(*record))
+
+    def checkpoint(self):
+        """Return the state needed to resume the log in a later run."""
+        lines = [line.as_record() for line in self.log_lines()]
+        return {
+            'version': CHECKPOINT_VERSION,
+            'branch': self.branch,
+            'base': self._base,
+            'head': self._head,
+            'lines': lines,
+        }
+
+    def resume(self, checkpoint):
+        """Reuse the log of a previous run, reading only newer commits.
+
+        Returns the PR numbers of the new commits or None if the
+        checkpoint is outdated and the full log has to be read.
+        """
+        base = rev_parse('origin/master')
+        head = rev_parse(self.branch)
+
+        if (checkpoint.get('version') != CHECKPOINT_VERSION or
+                checkpoint['branch'] != self.branch or
+                checkpoint['base'] != base or
+                not is_ancestor(checkpoint['head'], head)):
+            return None
+
+        new_lines = [LogLine(*record)
+                     for record in get_log(head, since=checkpoint['head'])]
+        self._base = base
+        self._head = head
+        self._by_pr = self._by_email = None
+        self._log_lines = [
+            LogLine(*record) for record in checkpoint['lines']] + new_lines
+
+        return sorted(set(
+            line.pr for line in new_lines if line.pr is not None))
+
+    def _build_index(self):
+        if self._by_pr is not None:
+            return
+
+        self._by_pr = {}
+        self._by_email = {}
+
+        for line in self.log_lines():
+            if line.pr is not None:
+                self._by_pr.setdefault(line.pr, []).append(line)
+            self._by_email.setdefault(line.email, []).append(line)
+
+    def lines_for_pr(self, pr):
+        """Return the log lines referencing a PR."""
+        self._build_index()
+        return self._by_pr.get(pr, [])
+
+    def lines_for_email(self, email):
+        """Return the log lines authored by an email address."""
+        self._build_index()
+        return self._by_email.get(email, [])
+
+    def emails(self):
+        """Return the unique author emails of the log."""
+        self._build_index()
+        return list(self._by_email)
+
+    def pr_numbers(self):
+        """Return the unique PR numbers referenced by the log."""
+        self._build_index()
+        return sorted(self._by_pr)
 
     def discover_users(self, known_users, prs):
         users = {}
 
-        for line in self.log_lines():
-            email = line.email
+        for email in self.emails():
+            pr = next((line.pr for line in self.lines_for_email(email)
+                       if line.pr is not None), None)
+
             if email in known_users:
                 github = known_users[email]
             elif email.endswith(GH_NO_EMAIL_SUFFIX):
                 github = email[:email.index(GH_NO_EMAIL_SUFFIX)]
-            elif line.pr is not None:
-                github = prs.get(line.pr).login
-                pass
+            elif pr is not None:
+                github = prs.get(pr).login
             else:
                 github = ''
 
@@ -1,8 +1,16 @@
 from github3.pulls import PullRequest
 
+_PATCHED = False
+
 
 def patch():
     """Add a missing attribute to github3.py."""
+    global _PATCHED
+
+    if _PATCHED:
+        return
+
+    _PATCHED = True
     old_update = PullRequest._update_attributes
 
     def new_update(self, pull):
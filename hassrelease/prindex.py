@@ -0,0 +1,83 @@
+import json
+import os
+
+from . import git
+from .const import HASS_REPO, INDEXED_REFS, PR_INDEX
+from .model import LogLine
+from .util import atomic_write_json
+
+# Bumped whenever the format of an indexed branch changes.
+PR_INDEX_VERSION = 2
+
+
+class PRIndex:
+    """Local index of PR numbers to the commits merging them, per branch.
+
+    Built from the '(#1234)' suffix of squash merge subjects and stored in
+    data/pr-index.json, per repository. update only reads commits added to
+    a branch since the previous update. Commits of a PR are kept oldest
+    first.
+    """
+
+    def __init__(self, refs=INDEXED_REFS, cwd=HASS_REPO, path=PR_INDEX):
+        self.refs = refs
+        self.cwd = cwd
+        self.path = path
+        self.data = {}
+
+        if os.path.isfile(path):
+            with open(path, 'rt') as inp:
+                # Branches indexed before the index was kept per repository
+                self.data = {key: value for key, value in
+                             json.load(inp).items() if 'head' not in value}
+
+        self.indexed = self.data.setdefault(os.path.abspath(cwd), {})
+        self.update()
+
+    def update(self):
+        """Index the commits added to the branches since the last update."""
+        changed = False
+
+        for ref in self.refs:
+            head = git.resolve_ref(ref, self.cwd)
+            if head is None:
+                continue
+
+            entry = self.indexed.get(ref)
+
+            if entry is not None and entry['head'] == head:
+                continue
+
+            if (entry is not None and
+                    entry.get('version') == PR_INDEX_VERSION and
+                    git.is_ancestor(entry['head'], head, self.cwd)):
+                revisions = '{}..{}'.format(entry['head'], head)
+                prs = entry['prs']
+            else:
+                revisions = head
+                prs = {}
+
+            for sha, subject in git.log_subjects(
+                    revisions, self.cwd, reverse=True):
+                pr = LogLine(sha, (), '', subject).pr
+                if pr is not None:
+                    prs.setdefault(str(pr), []).append(sha)
+
+            self.indexed[ref] = {
+                'version': PR_INDEX_VERSION, 'head': head, 'prs': prs}
+            changed = True
+
+        if changed:
+            atomic_write_json(self.path, self.data)
+
+    def commits(self, pr, ref=INDEXED_REFS[0]):
+        """Return the SHAs of commits on ref that reference a PR.
+
+        The first one merged the PR, later ones reuse its subject, like
+        cherry picks.
+        """
+        return self.indexed.get(ref, {}).get('prs', {}).get(str(pr), [])
+
+    def branches(self, pr):
+        """Return the indexed branches that contain a PR."""
+        return [ref for ref in self.refs if self.commits(pr, ref)]
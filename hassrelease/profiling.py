@@ -0,0 +1,86 @@
+from bisect import bisect_left
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+import json
+import threading
+import time
+
+# Upper bounds in seconds of the request latency histogram buckets.
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, float('inf'))
+
+
+class Stats:
+    """Timings of the phases of a command and counters of what it did."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.phases = OrderedDict()
+        self.counters = Counter()
+        self.latency = [0] * len(LATENCY_BUCKETS)
+        self.request_time = 0.0
+
+    @contextmanager
+    def phase(self, name):
+        """Time a phase of the command. Repeated phases add up."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self.lock:
+                self.phases[name] = self.phases.get(name, 0) + elapsed
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] += amount
+
+    def record_request(self, method, elapsed):
+        with self.lock:
+            self.counters['api.{}'.format(method.lower())] += 1
+            self.latency[bisect_left(LATENCY_BUCKETS, elapsed)] += 1
+            self.request_time += elapsed
+
+    def as_dict(self):
+        hits = self.counters['pr_cache.hit']
+        lookups = hits + self.counters['pr_cache.miss']
+        return {
+            'phases': {name: round(elapsed, 4)
+                       for name, elapsed in self.phases.items()},
+            'counters': dict(sorted(self.counters.items())),
+            'pr_cache_hit_rate':
+                round(hits / lookups, 3) if lookups else None,
+            'request_time': round(self.request_time, 4),
+            'latency_histogram': {
+                '<={}'.format(bound): count for bound, count
+                in zip(LATENCY_BUCKETS, self.latency)},
+        }
+
+    def print_table(self):
+        data = self.as_dict()
+        print()
+        print('{:<28} {:>10}'.format('Phase', 'Seconds'))
+        for name, elapsed in data['phases'].items():
+            print('{:<28} {:>10.3f}'.format(name, elapsed))
+        print()
+        for name, value in data['counters'].items():
+            print('{:<28} {:>10}'.format(name, value))
+        if data['pr_cache_hit_rate'] is not None:
+            print('{:<28} {:>10.1%}'.format(
+                'pr_cache hit rate', data['pr_cache_hit_rate']))
+        print('{:<28} {:>10.3f}'.format(
+            'seconds in requests', data['request_time']))
+        print()
+        print('{:<28} {:>10}'.format('Request latency', 'Requests'))
+        for bucket, count in data['latency_histogram'].items():
+            if count:
+                print('{:<28} {:>10}'.format(bucket + 's', count))
+
+    def write_json(self, path):
+        with open(path, 'wt') as outp:
+            json.dump(self.as_dict(), outp, indent=1)
+
+
+# Statistics of the running command
+stats = Stats()
+phase = stats.phase
+count = stats.count
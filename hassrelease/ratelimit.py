@@ -0,0 +1,133 @@
+import threading
+import time
+
+from .profiling import stats
+from .util import SessionMiddleware
+
+# Most requests in flight at once, reduced when GitHub throttles us.
+MAX_CONCURRENCY = 8
+# How often a throttled request is retried before giving up.
+THROTTLE_RETRIES = 5
+# Seconds to wait on a secondary rate limit without Retry-After.
+SECONDARY_LIMIT_WAIT = 60
+# Successful requests needed before allowing one more in flight.
+RAMP_UP_AFTER = 20
+
+
+class RateLimiter(SessionMiddleware):
+    """Schedule the requests of a session within GitHub's rate limits.
+
+    Tracks the remaining budget from the X-RateLimit headers, sleeps
+    until the reset when it runs out, retries throttled requests and
+    halves the concurrency whenever GitHub throttles.
+    """
+
+    def __init__(self, max_concurrency=MAX_CONCURRENCY, *, sleep=time.sleep):
+        self.max_concurrency = max_concurrency
+        self.concurrency = max_concurrency
+        self.sleep = sleep
+        self.cond = threading.Condition()
+        self.active = 0
+        self.successes = 0
+        self.remaining = None
+        self.reset = None
+        self.requests = 0
+        self.throttled = 0
+        self.throttled_time = 0.0
+
+    def request(self, send, method, url, **kwargs):
+        for attempt in range(THROTTLE_RETRIES + 1):
+            self._acquire()
+            start = time.perf_counter()
+            try:
+                resp = send(method, url, **kwargs)
+            finally:
+                self._release()
+                stats.record_request(method, time.perf_counter() - start)
+
+            delay = self._update(resp)
+
+            if delay is None or attempt == THROTTLE_RETRIES:
+                return resp
+
+            self._wait(delay)
+
+        return resp
+
+    def stats(self):
+        return {
+            'requests': self.requests,
+            'throttled': self.throttled,
+            'throttled_time': round(self.throttled_time, 1),
+            'remaining': self.remaining,
+        }
+
+    def print_stats(self):
+        print('GitHub: {requests} requests, throttled {throttled} times '
+              'for {throttled_time}s, {remaining} requests left'.format(
+                  **self.stats()))
+
+    def _acquire(self):
+        with self.cond:
+            while self.active >= self.concurrency:
+                self.cond.wait()
+            self.active += 1
+            self.requests += 1
+            exhausted = self.remaining == 0 and self.reset is not None
+            reset = self.reset
+
+        if exhausted:
+            self._wait(reset - time.time())
+            with self.cond:
+                if self.reset == reset:
+                    self.remaining = None
+
+    def _release(self):
+        with self.cond:
+            self.active -= 1
+            self.cond.notify()
+
+    def _update(self, resp):
+        """Track budget from response headers.
+
+        Returns seconds to wait before retrying or None if not throttled.
+        """
+        headers = resp.headers
+        now = time.time()
+
+        with self.cond:
+            if 'X-RateLimit-Remaining' in headers:
+                self.remaining = int(headers['X-RateLimit-Remaining'])
+            if 'X-RateLimit-Reset' in headers:
+                self.reset = int(headers['X-RateLimit-Reset'])
+
+            delay = None
+            if resp.status_code in (403, 429):
+                if 'Retry-After' in headers:
+                    delay = int(headers['Retry-After'])
+                elif self.remaining == 0 and self.reset is not None:
+                    delay = self.reset - now
+                elif 'rate limit' in resp.text.lower():
+                    delay = SECONDARY_LIMIT_WAIT
+
+            if delay is not None:
+                self.throttled += 1
+                self.successes = 0
+                self.concurrency = max(1, self.concurrency // 2)
+                # The caller waits out the reset before retrying
+                self.remaining = None
+            elif self.concurrency < self.max_concurrency:
+                self.successes += 1
+                if self.successes >= RAMP_UP_AFTER:
+                    self.successes = 0
+                    self.concurrency += 1
+                    self.cond.notify()
+
+        return delay
+
+    def _wait(self, delay):
+        # One extra second covers clock skew with GitHub
+        delay = max(0, delay) + 1
+        with self.cond:
+            self.throttled_time += delay
+        self.sleep(delay)
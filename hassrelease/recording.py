@@ -0,0 +1,107 @@
+import hashlib
+import json
+import os
+import sys
+import threading
+
+from .httpcache import make_response
+from .util import SessionMiddleware
+
+# Headers that describe the transfer, not the recorded body.
+TRANSFER_HEADERS = ('Content-Encoding', 'Content-Length', 'Transfer-Encoding',
+                    'Connection')
+
+
+def request_key(method, url, **kwargs):
+    """Return the name under which responses to a request are archived."""
+    body = kwargs.get('json')
+    if body is None:
+        body = kwargs.get('data')
+    if isinstance(body, bytes):
+        body = body.decode('utf-8')
+
+    return hashlib.sha256(json.dumps(
+        [method.upper(), url, kwargs.get('params'), body],
+        sort_keys=True).encode()).hexdigest()
+
+
+class Recorder(SessionMiddleware):
+    """Archive every response a session receives in a directory.
+
+    Each request is stored in its own file named by request_key, holding
+    the responses in the order they were received.
+    """
+
+    def __init__(self, path):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.lock = threading.Lock()
+        self.responses = {}
+
+    def request(self, send, method, url, **kwargs):
+        resp = send(method, url, **kwargs)
+        key = request_key(method, url, **kwargs)
+        entry = {
+            'method': method.upper(),
+            'url': url,
+            'status': resp.status_code,
+            'headers': {name: value for name, value in resp.headers.items()
+                        if name.title() not in TRANSFER_HEADERS},
+            'body': resp.content.decode('utf-8'),
+        }
+
+        with self.lock:
+            entries = self.responses.setdefault(key, [])
+            entries.append(entry)
+            with open(os.path.join(self.path, key + '.json'), 'wt') as outp:
+                json.dump(entries, outp, indent=1)
+
+        return resp
+
+
+class Replayer(SessionMiddleware):
+    """Serve the responses archived by a Recorder without any network.
+
+    Requests are never passed on to the session. Repeated requests get
+    the recorded responses in order, the last one is served again once
+    they run out.
+    """
+
+    def __init__(self, path):
+        if not os.path.isdir(path):
+            sys.stderr.write('No recording found at {}\n'.format(path))
+            sys.exit(1)
+
+        self.path = path
+        self.lock = threading.Lock()
+        self.responses = {}
+
+    def request(self, send, method, url, **kwargs):
+        key = request_key(method, url, **kwargs)
+
+        with self.lock:
+            if key not in self.responses:
+                self.responses[key] = self._load(key, method, url)
+
+            entries = self.responses[key]
+            entry = entries.pop(0) if len(entries) > 1 else entries[0]
+
+        headers = kwargs.get('headers') or {}
+        etag = entry['headers'].get('ETag')
+
+        # Revalidating a recorded response that was fetched in full
+        if (entry['status'] == 200 and etag is not None and
+                headers.get('If-None-Match') == etag):
+            return make_response(url, 304, {'ETag': etag}, b'')
+
+        return make_response(url, entry['status'], entry['headers'],
+                             entry['body'].encode('utf-8'))
+
+    def _load(self, key, method, url):
+        try:
+            with open(os.path.join(self.path, key + '.json'), 'rt') as inp:
+                return json.load(inp)
+        except FileNotFoundError:
+            sys.stderr.write('No recorded response for {} {}\n'.format(
+                method.upper(), url))
+            sys.exit(1)
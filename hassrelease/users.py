@@ -1,38 +1,167 @@
 #!/usr/bin/env python3
-from .const import GH_NO_EMAIL_SUFFIX, USERS_FILE
+import os
+import sys
+import time
 
+from .const import GH_NO_EMAIL_SUFFIX, USERS_FILE, USERS_NEGATIVE_TTL
+from .github import get_commit_authors
+from .util import atomic_open
 
-def load_users():
-    users = {}
 
-    try:
-        with open(USERS_FILE) as inp:
-            for lin in inp:
-                if ',' not in lin:
-                    lin = lin.strip() + ','
-                email, github = [val.strip() for val in lin.split(',')]
-                users[email] = github
-    except FileNotFoundError:
-        pass
+# Overridden lines in USERS_FILE before it is rewritten.
+COMPACT_AFTER = 100
 
-    return users
+
+class UserStore:
+    """GitHub usernames by email, backed by an append-only USERS_FILE.
+
+    Each line is 'email,github'. An empty github marks an email that is
+    not resolved yet, 'email,,<timestamp>' one that could not be resolved
+    at that time. Later lines override earlier ones, so adding a user
+    appends a single line; compact rewrites the file sorted.
+    """
+
+    def __init__(self, path=USERS_FILE):
+        self.path = path
+        self.users = {}
+        self.unresolvable = {}
+        self.lines = 0
+        # Set when the file was edited by hand and lacks a final newline
+        self.unterminated = False
+
+        try:
+            with open(path) as inp:
+                for lin in inp:
+                    self._parse(lin)
+                    self.unterminated = not lin.endswith('\n')
+        except FileNotFoundError:
+            pass
+
+    def _parse(self, lin):
+        email, github, checked = (
+            [val.strip() for val in lin.split(',')] + ['', ''])[:3]
+
+        if not email:
+            return
+
+        try:
+            checked = float(checked) if checked else None
+        except ValueError:
+            sys.stderr.write('Skipping malformed line in {}: {}\n'.format(
+                self.path, lin.strip()))
+            return
+
+        self.lines += 1
+        self.users[email] = github
+
+        if checked is not None:
+            self.unresolvable[email] = checked
+        else:
+            self.unresolvable.pop(email, None)
+
+    def __contains__(self, email):
+        return email in self.users
+
+    def __getitem__(self, email):
+        return self.users[email]
+
+    def __setitem__(self, email, github):
+        self._append(email, github)
+
+    def __len__(self):
+        return len(self.users)
+
+    def items(self):
+        return self.users.items()
+
+    def mark_unresolvable(self, email):
+        """Remember that an email could not be resolved for a while."""
+        self._append(email, '', int(time.time()))
+
+    def is_unresolvable(self, email):
+        """Return if resolving an email failed recently."""
+        checked = self.unresolvable.get(email)
+        return (checked is not None and
+                time.time() - checked < USERS_NEGATIVE_TTL)
+
+    def _append(self, email, github, checked=None):
+        lin = '{},{}'.format(email, github)
+        if checked is not None:
+            lin += ',{}'.format(checked)
+
+        with open(self.path, 'at') as outp:
+            if self.unterminated:
+                outp.write('\n')
+                self.unterminated = False
+            outp.write(lin + '\n')
+            outp.flush()
+            os.fsync(outp.fileno())
+
+        self._parse(lin)
+
+    def compact(self, force=False):
+        """Rewrite the file sorted, with one line per email.
+
+        Only done once COMPACT_AFTER lines are overridden, unless forced.
+        """
+        if not force and self.lines - len(self.users) < COMPACT_AFTER:
+            return
+
+        with atomic_open(self.path) as outp:
+            for email, github in sorted(self.users.items()):
+                if email in self.unresolvable:
+                    outp.write('{},,{}\n'.format(
+                        email, int(self.unresolvable[email])))
+                else:
+                    outp.write('{},{}\n'.format(email, github))
+        self.lines = len(self.users)
+
+
+_STORE = None
+
+
+def get_store():
+    """Return the user store shared by the whole process."""
+    global _STORE
+
+    if _STORE is None:
+        _STORE = UserStore()
+
+    return _STORE
+
+
+def needs_resolving(users, email):
+    """Return if the GitHub username of an email should be looked up."""
+    if email not in users:
+        return True
+
+    return (not users[email] and isinstance(users, UserStore) and
+            not users.is_unresolvable(email))
+
+
+def noreply_login(email):
+    """Return the username of a GitHub noreply email or None."""
+    if not email.endswith(GH_NO_EMAIL_SUFFIX):
+        return None
+
+    # Strip off suffix
+    github = email[:email.index(GH_NO_EMAIL_SUFFIX)]
+    # Emails are in format <userid>+<username>@suffix. Get username.
+    return github.split('+', 1)[-1]
 
 
 def resolve_user(users, email, *, pr=None, prs=None, ask_input=True, context=None):
-    """Resolves boolean if user added."""
-    if email in users:
-        return False
+    """Resolves boolean if user added.
 
-    github = None
+    An email left unresolved is remembered as such, but not added.
+    """
+    if not needs_resolving(users, email):
+        return False
 
-    if email.endswith(GH_NO_EMAIL_SUFFIX):
-        # Strip off suffix
-        github = email[:email.index(GH_NO_EMAIL_SUFFIX)]
-        # Emails are in format <userid>+<username>@suffix. Get username.
-        github = github.split('+', 1)[-1]
+    github = noreply_login(email)
 
-    elif pr is not None:
-        github = prs.get(pr).user.login
+    if github is None and pr is not None:
+        github = prs.get(pr).login
         print('Found {} for {} from PR #{}'.format(github, email, pr))
 
     if github is None:
@@ -44,34 +173,81 @@ def resolve_user(users, email, *, pr=None, prs=None, ask_input=True, context=Non
             print('Not asking input for {}'.format(email))
             return False
 
+    if not github and isinstance(users, UserStore):
+        users.mark_unresolvable(email)
+        return False
+
     users[email] = github
     return True
 
 
-def update_users_with_release(release, prs):
-    users = load_users()
+def resolve_users(users, release, prs):
+    """Resolve all unknown authors of a release in bulk.
 
+    Tries noreply emails, then commit authors and PR authors in bulk, and
+    only asks about the emails that are left. Returns numbers of users
+    added and of emails remembered as unresolvable.
+    """
+    pending = [email for email in release.emails()
+               if needs_resolving(users, email)]
     added = 0
+    unresolvable = 0
+
+    for email in list(pending):
+        github = noreply_login(email)
+        if github is not None:
+            users[email] = github
+            pending.remove(email)
+            added += 1
+
+    if pending:
+        shas = {release.lines_for_email(email)[0].sha: email
+                for email in pending}
+        for sha, github in get_commit_authors(prs.repo, shas).items():
+            print('Found {} for {} from commit {}'.format(
+                github, shas[sha], sha[:7]))
+            users[shas[sha]] = github
+            pending.remove(shas[sha])
+            added += 1
+
+    with_pr = {}
+    for email in pending:
+        pr = next((line.pr for line in release.lines_for_email(email)
+                   if line.pr is not None), None)
+        if pr is not None:
+            with_pr[email] = pr
+
+    prs.get_many(with_pr.values())
+
     ask_input = True
 
-    for line in release.log_lines():
+    for email in pending:
         try:
-            if resolve_user(users, line.email, pr=line.pr,
-                            prs=prs, ask_input=ask_input, context=line.line):
+            if resolve_user(
+                    users, email, pr=with_pr.get(email), prs=prs,
+                    ask_input=ask_input,
+                    context=release.lines_for_email(email)[0].line):
                 added += 1
+            elif (isinstance(users, UserStore) and
+                    users.is_unresolvable(email)):
+                unresolvable += 1
         except KeyboardInterrupt:
             ask_input = False
 
-    for email, github in sorted(users.items()):
-        if not github:
-            if resolve_user(users, email, ask_input=ask_input):
-                added += 1
+    return added, unresolvable
+
+
+def update_users_with_release(release, prs):
+    users = get_store()
+    added, unresolvable = resolve_users(users, release, prs)
 
     if added > 0:
         print("Added {} users".format(added))
-        with open(USERS_FILE, 'wt') as outp:
-            for email, github in sorted(users.items()):
-                outp.write('{},{}\n'.format(email, github))
+    if unresolvable > 0:
+        print("Could not resolve {} users".format(unresolvable))
+
+    if added > 0 or unresolvable > 0:
+        users.compact()
     else:
         print("Users up to date")
 
@@ -1,6 +1,62 @@
+from contextlib import contextmanager
+import json
+import os
 import subprocess
+import time
 
 
 def copy_clipboard(text):
     """Copy text to the Mac clipboard."""
     subprocess.run('pbcopy', input=text.encode())
+
+
+@contextmanager
+def atomic_open(path):
+    """Open a file for writing that replaces path once it is complete.
+
+    Readers and crashed runs never see a half written file.
+    """
+    tmp = path + '.tmp'
+    with open(tmp, 'wt') as outp:
+        yield outp
+    os.replace(tmp, path)
+
+
+def atomic_write_json(path, data, **kwargs):
+    """Replace path with data as JSON."""
+    with atomic_open(path) as outp:
+        json.dump(data, outp, **kwargs)
+
+
+def retry(func, *, retries, backoff, retry_on):
+    """Call func until it returns, retrying errors that retry_on accepts.
+
+    Waits backoff seconds before the first retry, doubled for every
+    retry. The error of the last attempt is raised.
+    """
+    for attempt in range(retries + 1):
+        try:
+            return func()
+        except Exception as exc:
+            if attempt == retries or not retry_on(exc):
+                raise
+
+        time.sleep(backoff * 2 ** attempt)
+
+
+class SessionMiddleware:
+    """Base of objects that see every request of a requests session.
+
+    Subclasses implement request(send, method, url, **kwargs), where send
+    passes the request on to the session or the next middleware.
+    """
+
+    def install(self, session):
+        """Route all requests of a requests session through request."""
+        send = session.request
+
+        def request(method, url, **kwargs):
+            return self.request(send, method, url, **kwargs)
+
+        session.request = request
+        return session
@@ -0,0 +1,8 @@
+import pytest
+
+from .git_repo import init_repo
+
+
+@pytest.fixture
+def repo(tmp_path, monkeypatch):
+    return init_repo(tmp_path, monkeypatch)
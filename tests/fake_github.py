@@ -0,0 +1,273 @@
+"""A minimal fake of the GitHub REST and GraphQL APIs for tests."""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import re
+import threading
+import time
+from types import SimpleNamespace
+from urllib.parse import parse_qsl, urlsplit
+
+import requests
+
+ALIAS_PATTERN = re.compile(r'pr(\d+): issueOrPullRequest\(number: (\d+)\)')
+COMMIT_PATTERN = re.compile(r'c([0-9a-f]+): object\(oid: "[0-9a-f]+"\)')
+
+
+def make_issue(number, *, labels=(), milestone=None, login='user',
+               body='', state='closed', merged=True):
+    """Return issue JSON as served by the REST API.
+
+    merged and merge_commit_sha are not part of issues, the fake serves
+    them for pulls.
+    """
+    return {
+        'number': number,
+        'merged': merged,
+        'merge_commit_sha': '{:040x}'.format(number) if merged else None,
+        'title': 'PR {}'.format(number),
+        'state': state,
+        'html_url': 'https://github.com/o/r/pull/{}'.format(number),
+        'body_text': body,
+        'user': {'login': login},
+        'labels': [{'name': label} for label in labels],
+        'milestone': {'title': milestone} if milestone else None,
+    }
+
+
+def pull_node(issue):
+    """Convert REST issue JSON to a GraphQL PR node of a milestone."""
+    return {
+        'number': issue['number'],
+        'title': issue['title'],
+        'merged': issue['merged'],
+        'mergeCommit': {'oid': issue['merge_commit_sha']}
+                       if issue['merged'] else None,
+        'labels': {'nodes': issue['labels']},
+    }
+
+
+def issue_node(issue):
+    """Convert REST issue JSON to a GraphQL node."""
+    return {
+        'number': issue['number'],
+        'title': issue['title'],
+        'state': issue['state'].upper(),
+        'url': issue['html_url'],
+        'bodyText': issue['body_text'],
+        'author': issue['user'],
+        'labels': {'nodes': issue['labels']},
+        'milestone': issue['milestone'],
+    }
+
+
+class FakeGitHub:
+    """Serve issues of repositories over HTTP on localhost.
+
+    issues maps 'owner/name' to a dict of number to issue JSON.
+    milestones maps 'owner/name' to a dict of milestone number to the
+    issue numbers in the milestone. milestone_info maps 'owner/name' to the
+    milestone JSON listed by the REST API. commits maps 'owner/name' to a
+    dict of commit SHA to the GitHub login of its author.
+    """
+
+    PAGE_SIZE = 100
+
+    def __init__(self, latency=0):
+        # Seconds every response is delayed, to mimic the real API
+        self.latency = latency
+        self.issues = {}
+        self.milestones = {}
+        self.milestone_info = {}
+        self.commits = {}
+        self.requests = []
+        # Number of upcoming requests to fail with a server error
+        self.errors = 0
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.url = 'http://127.0.0.1:{}'.format(self.server.server_port)
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def repo(self, name):
+        """Return a repository object as used by hassrelease."""
+        return SimpleNamespace(
+            session=requests.Session(),
+            _api='{}/repos/{}'.format(self.url, name))
+
+    def milestone_page(self, name, number, page):
+        """Return the issues of a page of a milestone listing."""
+        numbers = self.milestones[name][number]
+        return [self.issues[name][number] for number in
+                numbers[page * self.PAGE_SIZE:(page + 1) * self.PAGE_SIZE]]
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, data=None, headers=None):
+                body = json.dumps(data).encode() if data is not None else b''
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _failing(self):
+                if fake.latency:
+                    time.sleep(fake.latency)
+
+                with fake.lock:
+                    failing = fake.errors > 0
+                    fake.errors -= failing
+                if failing:
+                    self._send(502, {'message': 'Server Error'})
+                return failing
+
+            def do_GET(self):
+                fake.requests.append(('GET', self.path))
+                if self._failing():
+                    return
+
+                url = urlsplit(self.path)
+                query = dict(parse_qsl(url.query))
+                match = re.match(r'/repos/([^/]+/[^/]+)/issues$', url.path)
+
+                if match:
+                    return self._send(200, fake.milestone_page(
+                        match.group(1), int(query['milestone']),
+                        int(query.get('page', 1)) - 1))
+
+                match = re.match(r'/repos/([^/]+/[^/]+)/milestones$', url.path)
+
+                if match:
+                    return self._send_milestones(match.group(1), query)
+
+                match = re.match(r'/repos/([^/]+/[^/]+)/pulls/(\d+)$',
+                                 self.path)
+
+                if match:
+                    return self._send(200, fake.issues[match.group(1)][
+                        int(match.group(2))])
+
+                match = re.match(r'/repos/([^/]+/[^/]+)/issues/(\d+)$',
+                                 self.path)
+                issue = match and fake.issues.get(
+                    match.group(1), {}).get(int(match.group(2)))
+
+                if not issue:
+                    return self._send(404, {'message': 'Not Found'})
+
+                etag = '"{}"'.format(hash(json.dumps(issue, sort_keys=True)))
+                if self.headers.get('If-None-Match') == etag:
+                    return self._send(304, headers={'ETag': etag})
+                self._send(200, issue, {'ETag': etag})
+
+            def _send_milestones(self, name, query):
+                page = int(query.get('page', 1))
+                size = int(query.get('per_page', 30))
+                milestones = fake.milestone_info.get(name, [])
+                data = milestones[(page - 1) * size:page * size]
+                headers = {'ETag': '"{}"'.format(
+                    hash(json.dumps(data, sort_keys=True)))}
+
+                if len(milestones) > page * size:
+                    headers['Link'] = (
+                        '<{}/repos/{}/milestones?state=all&per_page={}&'
+                        'page={}>; rel="next"'.format(
+                            fake.url, name, size, page + 1))
+
+                if self.headers.get('If-None-Match') == headers['ETag']:
+                    return self._send(304, headers=headers)
+                self._send(200, data, headers)
+
+            def do_PATCH(self):
+                fake.requests.append(('PATCH', self.path))
+                length = int(self.headers['Content-Length'])
+                payload = json.loads(self.rfile.read(length))
+                match = re.match(r'/repos/([^/]+/[^/]+)/milestones/(\d+)$',
+                                 self.path)
+                milestone = next(
+                    ms for ms in fake.milestone_info[match.group(1)]
+                    if ms['number'] == int(match.group(2)))
+                milestone.update(payload)
+                self._send(200, milestone)
+
+            def do_POST(self):
+                fake.requests.append(('POST', self.path))
+                length = int(self.headers['Content-Length'])
+                payload = json.loads(self.rfile.read(length))
+
+                if self._failing():
+                    return
+
+                match = re.match(r'/repos/([^/]+/[^/]+)/issues/(\d+)/labels$',
+                                 self.path)
+
+                if match:
+                    issue = fake.issues.get(match.group(1), {}).get(
+                        int(match.group(2)))
+                    if issue is None:
+                        return self._send(404, {'message': 'Not Found'})
+                    with fake.lock:
+                        issue['labels'].extend(
+                            {'name': label} for label in payload)
+                    return self._send(200, issue['labels'])
+                variables = payload['variables']
+                name = '{owner}/{name}'.format(**variables)
+                issues = fake.issues.get(name, {})
+                repository = {}
+                errors = []
+
+                if not any(name in known for known in (
+                        fake.issues, fake.milestones, fake.commits)):
+                    return self._send(200, {
+                        'data': {'repository': None},
+                        'errors': [{'message': 'Could not resolve to a '
+                                    'Repository with the name {}.'.format(
+                                        name)}]})
+
+                if 'milestone(number:' in payload['query']:
+                    page = int(variables.get('cursor') or 0)
+                    nodes = fake.milestone_page(
+                        name, variables['number'], page)
+                    repository['milestone'] = {'pullRequests': {
+                        'nodes': [pull_node(node) for node in nodes],
+                        'pageInfo': {
+                            'hasNextPage': bool(fake.milestone_page(
+                                name, variables['number'], page + 1)),
+                            'endCursor': str(page + 1),
+                        }}}
+
+                for sha in COMMIT_PATTERN.findall(payload['query']):
+                    login = fake.commits.get(name, {}).get(sha)
+                    repository['c' + sha] = {'author': {
+                        'user': {'login': login} if login else None}}
+
+                for alias, number in ALIAS_PATTERN.findall(payload['query']):
+                    issue = issues.get(int(number))
+                    repository['pr' + alias] = \
+                        issue_node(issue) if issue else None
+                    if not issue:
+                        errors.append({'message': 'Could not resolve to a '
+                                       'PullRequest with the number of '
+                                       '{}.'.format(number)})
+
+                data = {'data': {'repository': repository}}
+                if errors:
+                    data['errors'] = errors
+                self._send(200, data)
+
+        return Handler
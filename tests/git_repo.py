@@ -0,0 +1,28 @@
+"""Helpers to build git repositories in tests."""
+import os
+import subprocess
+
+
+def init_repo(tmp_path, monkeypatch):
+    """Create an empty repository with a test identity."""
+    for var in 'AUTHOR', 'COMMITTER':
+        monkeypatch.setenv('GIT_{}_NAME'.format(var), 'Test')
+        monkeypatch.setenv('GIT_{}_EMAIL'.format(var), 'test@example.com')
+    monkeypatch.setenv('GIT_EDITOR', 'true')
+    path = str(tmp_path / 'repo')
+    run(tmp_path, 'git', 'init', '-q', path)
+    run(path, 'git', 'symbolic-ref', 'HEAD', 'refs/heads/master')
+    return path
+
+
+def run(cwd, *args):
+    return subprocess.run(args, cwd=str(cwd), check=True,
+                          stdout=subprocess.PIPE).stdout.decode().strip()
+
+
+def commit(repo, name, content, message):
+    with open(os.path.join(repo, name), 'w') as outp:
+        outp.write(content)
+    run(repo, 'git', 'add', name)
+    run(repo, 'git', 'commit', '-q', '-m', message)
+    return run(repo, 'git', 'rev-parse', 'HEAD')
@@ -0,0 +1,89 @@
+from types import SimpleNamespace
+
+from hassrelease.cache import PRStore
+from hassrelease.model import PRCache
+
+ISSUE = {
+    'number': 1234,
+    'title': 'Add light',
+    'state': 'closed',
+    'html_url': 'https://github.com/home-assistant/home-assistant/pull/1234',
+    'body_text': 'Docs in home-assistant/home-assistant.github.io#5',
+    'user': {'login': 'balloob'},
+    'labels': [{'name': 'new-platform'}],
+    'milestone': {'title': '0.60'},
+}
+
+
+class FakeSession:
+    def __init__(self, status_code=200):
+        self.status_code = status_code
+        self.requests = []
+
+    def get(self, url, headers, **kwargs):
+        self.requests.append((url, headers))
+        return SimpleNamespace(
+            status_code=self.status_code, headers={'ETag': '"abc"'},
+            json=lambda: ISSUE, raise_for_status=lambda: None)
+
+
+def fake_repo(session):
+    return SimpleNamespace(
+        session=session,
+        _api='https://api.github.com/repos/home-assistant/home-assistant')
+
+
+def test_store_roundtrip(tmp_path):
+    store = PRStore(str(tmp_path / 'cache.db'))
+    store.put('a/b', 1, {'title': 'Hello'}, '"etag"')
+
+    data, etag, _ = store.get('a/b', 1)
+    assert data == {'title': 'Hello'}
+    assert etag == '"etag"'
+    assert store.get('a/c', 1) is None
+
+    assert store.prune(max_age=-1) == 1
+    assert store.get('a/b', 1) is None
+
+
+def test_pr_cache_fetches_and_stores(tmp_path):
+    store = PRStore(str(tmp_path / 'cache.db'))
+    session = FakeSession()
+    pr = PRCache(fake_repo(session), store).get(1234)
+
+    assert pr.login == 'balloob'
+    assert pr.labels == ('new-platform',)
+    assert pr.milestone == '0.60'
+    assert len(session.requests) == 1
+
+    # Fresh entries are served without a request
+    PRCache(fake_repo(session), store).get(1234)
+    assert len(session.requests) == 1
+
+
+def test_pr_cache_revalidates(tmp_path):
+    store = PRStore(str(tmp_path / 'cache.db'))
+    PRCache(fake_repo(FakeSession()), store).get(1234)
+
+    session = FakeSession(status_code=304)
+    pr = PRCache(fake_repo(session), store, ttl=0).get('1234')
+
+    assert pr.title == 'Add light'
+    assert session.requests[0][1]['If-None-Match'] == '"abc"'
+
+
+def test_pr_cache_refetches_unexpected_not_modified(tmp_path):
+    class NotModifiedOnce(FakeSession):
+        def get(self, url, headers, **kwargs):
+            resp = super().get(url, dict(headers), **kwargs)
+            self.status_code = 200
+            return resp
+
+    session = NotModifiedOnce(status_code=304)
+    store = PRStore(str(tmp_path / 'cache.db'))
+    pr = PRCache(fake_repo(session), store).get(1)
+
+    assert pr.title == 'Add light'
+    assert len(session.requests) == 2
+    assert 'If-None-Match' not in session.requests[1][1]
+    assert session.requests[1][1]['Cache-Control'] == 'no-cache'
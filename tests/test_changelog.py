@@ -1,4 +1,11 @@
-from hassrelease.changelog import automation_link, _process_doc_label
+from types import SimpleNamespace
+
+import pytest
+
+from hassrelease.changelog import (
+    Change, Changelog, LabelInfo, _classify, automation_link, classify_label,
+    load, render, save)
+from hassrelease.model import PR, Release
 
 
 def test_automation_link():
@@ -17,11 +24,76 @@ def test_automation_link():
          '#numeric-state-trigger')
 
 
-def test_process_doc_label():
-    links = set()
-    parts = []
+def test_classify_label():
+    assert classify_label('platform: light.hue') == \
+        LabelInfo('light.hue', None, None, False)
+    assert classify_label('component: recorder').doc is None
+    assert classify_label('cherry-picked') == \
+        LabelInfo(None, 'cherry-picked', '(beta fix)', False)
+    assert classify_label('new-feature').suffix == '(new-feature)'
+    assert classify_label('reverted').ignore
+
+
+def test_render_both_formats_from_one_classification():
+    log = Changelog('0.60.0', False,
+                    ['new-platform', 'new-feature', 'breaking change'], [
+                        Change('Add Hue', 'balloob', 1, ['light.hue'],
+                               ['new-platform']),
+                        Change('Fix MQTT', 'pvizeli', 2,
+                               ['automation.mqtt']),
+                    ])
+
+    website = render(log, website_tags=True)
+    github = render(log, website_tags=False)
+
+    line = '- Add Hue ([@balloob] - [#1]) ([light.hue docs]) (new-platform)'
+    assert website.count(line) == 2
+    assert github.count(line) == 2
+    assert '## {% linkable_title New Platforms %}' in website
+    assert '## New Platforms' in github
+    assert '[light.hue docs]: /components/light.hue/' in website
+    assert ('[light.hue docs]: '
+            'https://www.home-assistant.io/components/light.hue/') in github
+    assert '#mqtt-trigger' in github
+
+
+def test_save_and_load(tmp_path):
+    log = Changelog('0.60.1', True, ['new-feature'], [
+        Change('Fix Hue', 'balloob', 1, ['light.hue'], [], ['bugfix'])])
+    path = str(tmp_path / 'release.json')
+
+    save(log, path)
+    loaded = load(path)
+
+    assert loaded.date == log.date.replace(microsecond=0)
+    assert loaded.changes[0].as_dict() == log.changes[0].as_dict()
+    assert render(loaded, website_tags=True) == \
+        render(log, website_tags=True)
+
+
+def test_classify_rejects_unresolved_users(monkeypatch, capsys):
+    monkeypatch.setattr('hassrelease.model.rev_parse', lambda ref: ref)
+    monkeypatch.setattr('hassrelease.model.get_log', lambda branch: iter([
+        ('c1', [], 'a@example.com', 'Add light (#1)'),
+        ('c2', [], 'b@example.com', 'Add switch (#2)'),
+        ('c3', [], 'bot@example.com', 'Bump version'),
+    ]))
+    prs = {number: PR({'number': number, 'milestone': None, 'labels': []})
+           for number in (1, 2)}
+    # b@example.com could not be resolved recently
+    users = {'a@example.com': 'alice', 'b@example.com': '',
+             'bot@example.com': ''}
+
+    with pytest.raises(SystemExit):
+        _classify(Release('0.60.0', branch='rc'),
+                  SimpleNamespace(get=prs.get), users)
 
-    _process_doc_label('platform: light.hue', parts, links)
+    out = capsys.readouterr().out
+    assert 'unresolved user b@example.com' in out
+    assert 'bot@example.com' not in out
 
-    assert parts[-1] == '([light.hue docs])'
-    assert next(iter(links)).startswith('[light.hue docs]')
+    # Authors of commits without a PR are not part of the changelog
+    users['b@example.com'] = 'bob'
+    log = _classify(Release('0.60.0', branch='rc'),
+                    SimpleNamespace(get=prs.get), users)
+    assert [change.user for change in log.changes] == ['alice', 'bob']
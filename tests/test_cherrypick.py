@@ -0,0 +1,51 @@
+from hassrelease.cherrypick import CherryPickPlan, PatchIdIndex
+
+from .git_repo import commit, run
+
+
+def test_resume_after_conflict(repo, tmp_path):
+    commit(repo, 'a', 'base', 'Base')
+    run(repo, 'git', 'checkout', '-q', '-b', 'dev')
+    shas = [commit(repo, 'b', 'one', 'One (#1)'),
+            commit(repo, 'a', 'two', 'Two (#2)'),
+            commit(repo, 'c', 'three', 'Three (#3)')]
+    run(repo, 'git', 'checkout', '-q', 'master')
+    commit(repo, 'a', 'conflict', 'Conflict')
+
+    labelled = []
+    plan = CherryPickPlan.create('0.60', repo, [
+        (number, sha, 'PR') for number, sha in zip([1, 2, 3], shas)],
+        str(tmp_path / 'journal.json'))
+
+    assert not plan.run(labelled.append)
+    assert labelled == [1]
+
+    # Resume is refused until the conflict is resolved
+    plan = CherryPickPlan.load(plan.path)
+    assert not plan.run(labelled.append)
+
+    commit(repo, 'a', 'resolved', 'Two (#2)')
+    run(repo, 'git', 'cherry-pick', '--continue')
+
+    assert plan.run(labelled.append)
+    assert labelled == [1, 2, 3]
+    assert CherryPickPlan.load(plan.path) is None
+
+
+def test_patch_id_index(repo, tmp_path):
+    commit(repo, 'a', 'base', 'Base')
+    run(repo, 'git', 'update-ref', 'refs/remotes/origin/master', 'HEAD')
+    run(repo, 'git', 'checkout', '-q', '-b', 'dev')
+    picked = commit(repo, 'b', 'one', 'One (#1)')
+    new = commit(repo, 'c', 'two', 'Two (#2)')
+    run(repo, 'git', 'checkout', '-q', 'master')
+    path = str(tmp_path / 'patch-ids.json')
+
+    # Cherry picked by hand, without labelling the PR
+    run(repo, 'git', 'cherry-pick', picked)
+    assert PatchIdIndex(repo, path=path).applied([picked, new]) == {picked}
+
+    # Picked up incrementally
+    run(repo, 'git', 'cherry-pick', new)
+    assert PatchIdIndex(repo, path=path).applied([picked, new]) == \
+        {picked, new}
@@ -0,0 +1,130 @@
+from types import SimpleNamespace
+
+from click.testing import CliRunner
+
+from hassrelease.commands import cli, load_checkpoint
+
+from .fake_github import FakeGitHub, make_issue
+from .git_repo import commit, init_repo, run
+
+DOCS = 'home-assistant/home-assistant.github.io#{}'
+HASS = 'home-assistant/home-assistant'
+
+
+def use_fake(monkeypatch, fake):
+    monkeypatch.setattr(
+        'hassrelease.github.get_session', lambda: SimpleNamespace(
+            repository=lambda owner, name: fake.repo(
+                '{}/{}'.format(owner, name))))
+
+
+def test_release_notes_resume(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'data').mkdir()
+    (tmp_path / 'data' / 'users.csv').write_text('a@example.com,alice\n')
+    monkeypatch.setattr('hassrelease.commands.copy_clipboard', print)
+    refs = {'origin/master': 'base', 'rc': 'c1'}
+    monkeypatch.setattr('hassrelease.model.rev_parse', refs.get)
+    monkeypatch.setattr('hassrelease.model.is_ancestor', lambda a, b: True)
+    log = [('c{}'.format(number), [], 'a@example.com',
+            'Add light {0} (#{0})'.format(number)) for number in range(1, 31)]
+    monkeypatch.setattr('hassrelease.model.get_log',
+                        lambda branch, since=None: iter(log[:-1]))
+
+    with FakeGitHub() as fake:
+        fake.issues[HASS] = {
+            number: make_issue(number) for number in range(1, 31)}
+        use_fake(monkeypatch, fake)
+        args = ['release-notes', '--release', '0.60.0b1', '--force-update']
+
+        result = CliRunner().invoke(cli, args, input='\n\n')
+        assert result.exit_code == 0, result.output
+
+        # A new commit on top of the previous run, all older PRs are stale
+        refs['rc'] = 'c2'
+        monkeypatch.setattr('hassrelease.model.get_log',
+                            lambda branch, since=None: iter(log[-1:]))
+        del fake.requests[:]
+        result = CliRunner().invoke(cli, args, input='\n\n')
+
+    assert result.exit_code == 0, result.output
+    assert 'found 1 new PRs' in result.output
+    # All PRs are refreshed in one bulk query
+    assert fake.requests == [('POST', '/graphql')]
+
+
+def test_load_checkpoint(tmp_path):
+    path = str(tmp_path / 'checkpoint.json')
+    assert load_checkpoint(path) is None
+
+    # Left behind by a run killed while writing it
+    with open(path, 'wt') as outp:
+        outp.write('{"version": 1, "lines": [')
+    assert load_checkpoint(path) is None
+
+
+def test_unmerged_docs(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'data').mkdir()
+    monkeypatch.setattr('hassrelease.model.rev_parse', lambda ref: ref)
+    monkeypatch.setattr('hassrelease.model.get_log', lambda branch: iter([
+        ('c1', [], 'a@example.com', 'Add light (#1)'),
+        ('c2', [], 'a@example.com', 'Add switch (#2)'),
+        ('c3', [], 'a@example.com', 'Add fan (#3)'),
+        ('c4', [], 'a@example.com', 'Add lock (#4)'),
+    ]))
+    monkeypatch.setattr('hassrelease.model.PREFETCH_BATCH_SIZE', 2)
+
+    with FakeGitHub() as fake:
+        fake.issues['home-assistant/home-assistant'] = {
+            1: make_issue(1, body='Docs: ' + DOCS.format(10)),
+            2: make_issue(2, body=' '.join(DOCS.format(n) for n in (11, 12))),
+            3: make_issue(3, body='Docs: ' + DOCS.format(11)),
+            4: make_issue(4),
+        }
+        fake.issues['home-assistant/home-assistant.github.io'] = {
+            10: make_issue(10),
+            11: make_issue(11, state='open'),
+            12: make_issue(12, state='open'),
+        }
+        use_fake(monkeypatch, fake)
+
+        result = CliRunner().invoke(cli, ['unmerged-docs', '0.60.0'])
+
+    assert result.exit_code == 0, result.output
+    assert 'PR 2\nhttps://github.com/o/r/pull/11\n' \
+        'https://github.com/o/r/pull/12\n' in result.output
+    assert 'PR 3\nhttps://github.com/o/r/pull/11\n' in result.output
+    assert 'PR 1' not in result.output
+    assert result.output.endswith(
+        'Found 3 unmerged docs PRs. 3 of 4 PRs reference docs.\n')
+    # Bulk queries only, every docs PR is loaded once in one of two batches
+    assert [method for method, _ in fake.requests] == ['POST'] * 3
+
+
+def test_milestone_list_commits(tmp_path, monkeypatch):
+    repo = init_repo(tmp_path, monkeypatch)
+    local = commit(repo, 'a', 'one', 'Add light (#1)')
+    run(repo, 'git', 'update-ref', 'refs/remotes/origin/dev', local)
+    monkeypatch.setattr('hassrelease.commands.HASS_REPO', repo)
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'data').mkdir()
+
+    with FakeGitHub() as fake:
+        for name in HASS, 'home-assistant/home-assistant-polymer':
+            fake.issues[name] = {1: make_issue(1)}
+            fake.milestones[name] = {1: [1]}
+            fake.milestone_info[name] = [
+                {'number': 1, 'title': '0.60', 'state': 'open'}]
+        use_fake(monkeypatch, fake)
+
+        result = CliRunner().invoke(cli, ['milestone-list-commits', '0.60'])
+        assert result.output.strip() == local
+
+        # The home-assistant clone knows nothing about other repositories
+        result = CliRunner().invoke(cli, [
+            'milestone-list-commits', '--repository',
+            'home-assistant-polymer', '0.60'])
+
+    assert result.exit_code == 0, result.output
+    assert result.output.strip() == '{:040x}'.format(1)
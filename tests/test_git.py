@@ -0,0 +1,52 @@
+from io import BufferedReader, BytesIO
+
+from hassrelease.git import (
+    cherry_pick_in_progress, is_ancestor, parse_version, read_records,
+    resolve_ref)
+
+from .git_repo import commit, run
+
+
+def test_read_records_across_chunks():
+    stream = BufferedReader(BytesIO(b'first\0second record\0last'))
+
+    assert list(read_records(stream, size=4)) == [
+        b'first', b'second record', b'last']
+
+
+def test_parse_version_format():
+    assert parse_version(
+        "MAJOR_VERSION = 0\n"
+        "MINOR_VERSION = 60\n"
+        "PATCH_VERSION = '0b1'\n"
+        "__short_version__ = '{}.{}'.format(MAJOR_VERSION, MINOR_VERSION)\n"
+        "__version__ = '{}.{}'.format(__short_version__, PATCH_VERSION)\n"
+        "REQUIRED_PYTHON_VER = (3, 5, 3)\n"
+        "CONF_X = get_x()\n") == '0.60.0b1'
+
+
+def test_parse_version_fstring():
+    assert parse_version(
+        "MAJOR_VERSION = 0\n"
+        "MINOR_VERSION = 90\n"
+        "PATCH_VERSION = '1'\n"
+        "__short_version__ = f'{MAJOR_VERSION}.{MINOR_VERSION}'\n"
+        "__version__ = f'{__short_version__}.' + PATCH_VERSION\n") == \
+        '0.90.1'
+
+
+def test_resolve_ref(repo):
+    first = commit(repo, 'a', 'one', 'Add light (#1)')
+
+    assert resolve_ref('HEAD', repo) == first
+    assert resolve_ref('missing', repo) is None
+    assert not cherry_pick_in_progress(repo)
+
+    # The shared cat-file process sees refs that change later on
+    second = commit(repo, 'a', 'two', 'Fix light (#2)')
+    run(repo, 'git', 'update-ref', 'CHERRY_PICK_HEAD', first)
+
+    assert resolve_ref('HEAD', repo) == second
+    assert cherry_pick_in_progress(repo)
+    assert is_ancestor(first, second, repo)
+    assert not is_ancestor(second, first, repo)
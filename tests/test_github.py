@@ -0,0 +1,69 @@
+import subprocess
+import sys
+
+import pytest
+
+from hassrelease.github import (
+    GraphQLError, get_commit_authors, get_milestone_prs, graphql_url,
+    save_token_check, token_checked)
+from hassrelease.model import PRCache
+
+from .fake_github import FakeGitHub, make_issue
+
+
+def test_graphql_url():
+    assert graphql_url('https://api.github.com/repos/o/r') == \
+        'https://api.github.com/graphql'
+    assert graphql_url('https://ghe.example.com/api/v3/repos/o/r') == \
+        'https://ghe.example.com/api/graphql'
+
+
+def test_get_milestone_prs():
+    with FakeGitHub() as fake:
+        fake.issues['o/r'] = {
+            number: make_issue(number, merged=number != 7,
+                               labels=['cherry-picked'] if number < 5 else [])
+            for number in range(1, 251)}
+        fake.milestones['o/r'] = {3: list(reversed(range(1, 251)))}
+
+        prs = get_milestone_prs(fake.repo('o/r'), 3)
+
+        assert [pr.number for pr in prs] == list(range(1, 251))
+        assert prs[0].labels == ['cherry-picked']
+        assert prs[6].merged is False
+        assert prs[6].merge_commit_sha is None
+        assert prs[7].merge_commit_sha == '{:040x}'.format(8)
+        assert len(fake.requests) == 3
+
+
+def test_graphql_errors():
+    with FakeGitHub() as fake:
+        fake.issues['o/r'] = {1: make_issue(1)}
+
+        # PRs that do not exist are left to REST
+        assert PRCache(fake.repo('o/r')).prefetch([1, 2]) == (1, 1)
+
+        for query in (lambda repo: get_milestone_prs(repo, 1),
+                      lambda repo: get_commit_authors(repo, ['c1']),
+                      lambda repo: PRCache(repo).prefetch([1])):
+            with pytest.raises(GraphQLError, match='Could not resolve'):
+                query(fake.repo('o/missing'))
+
+
+def test_token_check(tmp_path):
+    path = str(tmp_path / 'token-check.json')
+    assert not token_checked('abc', path)
+
+    save_token_check('abc', path)
+
+    assert token_checked('abc', path)
+    assert not token_checked('def', path)
+    assert not token_checked('abc', path, ttl=0)
+
+
+def test_cli_does_not_import_github3():
+    code = ('import sys; import hassrelease.__main__; '
+            'print("github3" in sys.modules)')
+    out = subprocess.run([sys.executable, '-c', code],
+                         stdout=subprocess.PIPE, check=True)
+    assert out.stdout.strip() == b'False'
@@ -0,0 +1,49 @@
+from types import SimpleNamespace
+
+from hassrelease.httpcache import HTTPCache
+
+from .fake_github import FakeGitHub, make_issue
+
+
+def test_revalidates_with_etag(tmp_path):
+    with FakeGitHub() as fake:
+        fake.issues['o/r'] = {1: make_issue(1)}
+        repo = fake.repo('o/r')
+        cache = HTTPCache(str(tmp_path / 'http.db'))
+        cache.install(repo.session)
+        url = repo._api + '/issues/1'
+
+        first = repo.session.get(url)
+        second = repo.session.get(url)
+
+        assert second.json() == first.json()
+        assert second.from_cache
+        assert fake.requests == [
+            ('GET', '/repos/o/r/issues/1')] * 2
+
+        fake.issues['o/r'][1]['title'] = 'Changed'
+        assert repo.session.get(url).json()['title'] == 'Changed'
+
+
+def test_serves_fresh_without_request(tmp_path):
+    sent = []
+
+    def send(method, url, **kwargs):
+        sent.append(kwargs.get('headers'))
+        return SimpleNamespace(status_code=200, content=b'{"a": 1}',
+                               headers={'Cache-Control': 'private, max-age=60',
+                                        'Link': '<next>; rel="next"'})
+
+    cache = HTTPCache(str(tmp_path / 'http.db'))
+    cache.request(send, 'GET', 'url')
+    resp = cache.request(send, 'GET', 'url')
+
+    assert resp.json() == {'a': 1}
+    assert resp.headers['link'] == '<next>; rel="next"'
+    assert len(sent) == 1
+
+    # Explicit revalidation and other methods bypass the cache
+    cache.request(send, 'GET', 'url', headers={'If-None-Match': '"x"'})
+    cache.request(send, 'POST', 'url')
+    assert len(sent) == 3
+    assert cache.clear() == 1
@@ -0,0 +1,37 @@
+import json
+
+from hassrelease.labels import LabelQueue
+
+from .fake_github import FakeGitHub, make_issue
+
+
+def test_label_queue(tmp_path, monkeypatch):
+    monkeypatch.setattr('hassrelease.labels.LABEL_BACKOFF', 0)
+    path = str(tmp_path / 'pending.json')
+
+    # Left behind by a crashed run
+    with open(path, 'w') as outp:
+        json.dump([['o/r', 1, ['cherry-picked']],
+                   ['o/other', 9, ['cherry-picked']]], outp)
+
+    with FakeGitHub() as fake:
+        fake.issues['o/r'] = {
+            number: make_issue(number) for number in range(1, 11)}
+        fake.errors = 2
+        queue = LabelQueue(fake.repo('o/r'), path=path)
+
+        for number in range(2, 11):
+            queue.add(number, 'cherry-picked')
+        # Not retried, not kept for the next run
+        queue.add(404, 'cherry-picked')
+
+        assert queue.flush() == 0
+        assert [entry for entry, _ in queue.rejected] == [
+            ['o/r', 404, ['cherry-picked']]]
+        assert fake.requests.count(
+            ('POST', '/repos/o/r/issues/404/labels')) == 1
+        assert all(issue['labels'] == [{'name': 'cherry-picked'}]
+                   for issue in fake.issues['o/r'].values())
+
+    with open(path) as inp:
+        assert json.load(inp) == [['o/other', 9, ['cherry-picked']]]
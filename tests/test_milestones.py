@@ -0,0 +1,59 @@
+import pytest
+
+from hassrelease.github import (
+    close_milestone, get_latest_version_milestone, get_milestone_by_title)
+from hassrelease.milestones import MilestoneIndex
+
+from .fake_github import FakeGitHub
+
+
+def milestone(number, title, state='open'):
+    return {'number': number, 'title': title, 'state': state}
+
+
+@pytest.fixture
+def fake(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'data').mkdir()
+    with FakeGitHub() as fake:
+        fake.milestone_info['o/r'] = [
+            milestone(number, '0.{}'.format(number), 'closed')
+            for number in range(1, 150)] + [
+            milestone(150, '0.150'), milestone(151, '0.99'),
+            milestone(152, 'Future')]
+        yield fake
+
+
+def test_lookup_from_index(fake):
+    repo = fake.repo('o/r')
+
+    assert get_latest_version_milestone(repo).number == 150
+    assert get_milestone_by_title(repo, '0.12').state == 'closed'
+    assert len(fake.requests) == 2
+
+    # Warm runs do not talk to GitHub
+    assert get_milestone_by_title(repo, '0.99').number == 151
+    assert len(fake.requests) == 2
+
+
+def test_revalidates_pages(fake):
+    repo = fake.repo('o/r')
+    MilestoneIndex(repo, ttl=0).latest_version()
+    fake.milestone_info['o/r'].append(milestone(153, '0.153'))
+    del fake.requests[:]
+
+    assert MilestoneIndex(repo, ttl=0).latest_version().number == 153
+    assert len(fake.requests) == 2
+
+
+def test_close_and_missing_milestone(fake):
+    repo = fake.repo('o/r')
+    close_milestone(repo, get_milestone_by_title(repo, '0.150'))
+
+    assert get_latest_version_milestone(repo).title == '0.99'
+
+    fake.milestone_info['o/r'].append(milestone(153, '0.153'))
+    assert get_milestone_by_title(repo, '0.153').number == 153
+
+    with pytest.raises(SystemExit):
+        get_milestone_by_title(repo, '1.0')
@@ -2,21 +2,74 @@ from hassrelease.model import LogLine, Release
 
 
 def test_logline_basic():
-    line = LogLine("- Hello world (test@email.com)\n")
+    line = LogLine('abc', ['def'], 'test@email.com', 'Hello world')
 
     assert line.message == 'Hello world'
     assert line.email == 'test@email.com'
     assert line.pr is None
+    assert line.line == '- Hello world (test@email.com)'
 
 
 def test_logline_with_pr():
-    line = LogLine("- Hello world (#1234) (test@email.com)\n")
+    line = LogLine('abc', ['def'], 'test@email.com', 'Hello world (#1234)')
 
     assert line.message == 'Hello world'
     assert line.email == 'test@email.com'
     assert line.pr == 1234
 
 
+def test_logline_with_parentheses():
+    line = LogLine('abc', [], 'test@email.com', 'Fix (#12) ref (in) (#34)')
+
+    assert line.message == 'Fix (#12) ref (in)'
+    assert line.pr == 34
+
+
 def test_release_branch():
     release = Release('0.40.1')
     assert release.branch == 'release-0-40-1'
+
+
+def test_release_identifiers():
+    beta = Release('0.60.0b2', branch='rc')
+    assert beta.identifier == 'release-0-60-0b2'
+    assert beta.base_identifier == 'release-0-60'
+    assert Release('0.60.0', branch='rc').identifier == 'release-0-60'
+    assert Release('0.60.1', branch='rc').identifier == 'release-0-60-1'
+
+
+def test_release_resume(monkeypatch):
+    refs = {'origin/master': 'base', 'rc': 'new'}
+    monkeypatch.setattr('hassrelease.model.rev_parse', refs.get)
+    monkeypatch.setattr('hassrelease.model.is_ancestor', lambda a, b: True)
+    monkeypatch.setattr('hassrelease.model.get_log', lambda branch, since: [
+        ('c3', ['c2'], 'a@example.com', 'Fix light (#3)')])
+    release = Release('0.60.0b2', branch='rc')
+    checkpoint = {
+        'version': 2, 'branch': 'rc', 'base': 'base', 'head': 'old',
+        'lines': [['c1', ['c0'], 'a@example.com', 'Add light (#1)'],
+                  ['c2', ['c1'], 'b@example.com', 'Add switch (#2)']]}
+
+    assert release.resume(checkpoint) == [3]
+    assert release.pr_numbers() == [1, 2, 3]
+    assert release.checkpoint()['head'] == 'new'
+
+    checkpoint['base'] = 'moved'
+    assert Release('0.60.0b2', branch='rc').resume(checkpoint) is None
+
+
+def test_release_indexes(monkeypatch):
+    monkeypatch.setattr('hassrelease.model.rev_parse', lambda ref: ref)
+    monkeypatch.setattr('hassrelease.model.get_log', lambda branch: iter([
+        ('c1', [], 'a@example.com', 'Add light (#1)'),
+        ('c2', ['c1'], 'b@example.com', 'Fix typo'),
+        ('c3', ['c2'], 'a@example.com', 'Add light again (#1)'),
+    ]))
+    release = Release('0.60.0', branch='rc')
+
+    assert [line.sha for line in release.lines_for_pr(1)] == ['c1', 'c3']
+    assert release.lines_for_pr(2) == []
+    assert [line.sha for line in release.lines_for_email('b@example.com')] \
+        == ['c2']
+    assert release.emails() == ['a@example.com', 'b@example.com']
+    assert release.pr_numbers() == [1]
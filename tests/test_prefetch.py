@@ -0,0 +1,53 @@
+from hassrelease.cache import PRStore
+from hassrelease.model import PRCache
+
+from .fake_github import FakeGitHub, make_issue
+
+
+def test_prefetch_batches_requests(tmp_path):
+    with FakeGitHub() as fake:
+        fake.issues['o/r'] = {
+            number: make_issue(number, labels=['new-feature'])
+            for number in range(1, 121)}
+        prs = PRCache(fake.repo('o/r'), PRStore(str(tmp_path / 'cache.db')))
+
+        assert prs.prefetch(list(range(1, 121)) + [999]) == (120, 3)
+        assert prs.get(60).labels == ('new-feature',)
+        assert len(fake.requests) == 3
+
+        # Unknown PRs are fetched on demand
+        fake.issues['o/r'][999] = make_issue(999)
+        assert prs.get(999).title == 'PR 999'
+        assert fake.requests[-1] == ('GET', '/repos/o/r/issues/999')
+
+        # Everything is fresh in the store now
+        assert PRCache(prs.repo, prs.store).prefetch(range(1, 121)) == (0, 0)
+
+
+def test_get_many_keeps_order_and_retries(tmp_path, monkeypatch):
+    monkeypatch.setattr('hassrelease.model.FETCH_BACKOFF', 0)
+
+    with FakeGitHub() as fake:
+        fake.issues['o/r'] = {
+            number: make_issue(number) for number in range(1, 41)}
+        fake.errors = 2
+        prs = PRCache(fake.repo('o/r'), PRStore(str(tmp_path / 'cache.db')))
+        numbers = [30, 2, 17, 2, 40, 1]
+
+        result = prs.get_many(numbers, workers=4)
+
+        assert [pr.number for pr in result] == numbers
+        # One bulk query, retried after two server errors
+        assert fake.requests == [('POST', '/graphql')] * 3
+
+        # Stale PRs are refreshed in bulk, not one by one
+        stale = PRCache(prs.repo, prs.store, ttl=0)
+        assert len(stale.get_many(range(1, 41))) == 40
+        assert fake.requests[3:] == [('POST', '/graphql')]
+
+        # Single PRs are fetched over REST, with retries
+        fake.errors = 2
+        del fake.requests[:]
+        pr = PRCache(prs.repo, prs.store, ttl=0).get(40)
+        assert pr.number == 40
+        assert len(fake.requests) == 3
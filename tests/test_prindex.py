@@ -0,0 +1,40 @@
+from hassrelease.prindex import PRIndex
+
+from .git_repo import commit, run
+
+
+def test_pr_index(repo, tmp_path):
+    path = str(tmp_path / 'pr-index.json')
+    first = commit(repo, 'a', 'one', 'Add light (#1)')
+    run(repo, 'git', 'checkout', '-q', '-b', 'rc')
+    commit(repo, 'b', 'two', 'Fix light (#2)')
+
+    index = PRIndex(('master', 'rc', 'missing'), repo, path)
+
+    assert index.commits(1, 'master') == [first]
+    assert index.branches(1) == ['master', 'rc']
+    assert index.branches(2) == ['rc']
+
+    third = commit(repo, 'c', 'three', 'Fix switch (#3)')
+    index = PRIndex(('master', 'rc'), repo, path)
+
+    assert index.commits(3, 'rc') == [third]
+    assert index.branches(1) == ['master', 'rc']
+
+    # Commits of a PR stay oldest first, built in full or incrementally
+    fourth = commit(repo, 'c', 'four', 'Fix switch (#3)')
+    assert PRIndex(('rc',), repo, path).commits(3, 'rc') == [third, fourth]
+    fresh = str(tmp_path / 'fresh.json')
+    assert PRIndex(('rc',), repo, fresh).commits(3, 'rc') == [third, fourth]
+
+
+def test_pr_index_per_repository(repo, tmp_path):
+    path = str(tmp_path / 'pr-index.json')
+    first = commit(repo, 'a', 'one', 'Add light (#1)')
+    other = str(tmp_path / 'other')
+    run(tmp_path, 'git', 'init', '-q', other)
+    second = commit(other, 'a', 'two', 'Add panel (#1)')
+
+    assert PRIndex(('HEAD',), repo, path).commits(1, 'HEAD') == [first]
+    assert PRIndex(('HEAD',), other, path).commits(1, 'HEAD') == [second]
+    assert PRIndex(('HEAD',), repo, path).commits(1, 'HEAD') == [first]
@@ -0,0 +1,34 @@
+import json
+
+from hassrelease.profiling import Stats
+
+
+def test_phases_add_up():
+    stats = Stats()
+    with stats.phase('fetch'):
+        pass
+    with stats.phase('fetch'):
+        pass
+    with stats.phase('write'):
+        pass
+    assert list(stats.as_dict()['phases']) == ['fetch', 'write']
+
+
+def test_counters_and_hit_rate(tmpdir):
+    stats = Stats()
+    stats.count('pr_cache.hit', 3)
+    stats.count('pr_cache.miss')
+    stats.record_request('GET', 0.07)
+    stats.record_request('POST', 10)
+
+    data = stats.as_dict()
+    assert data['pr_cache_hit_rate'] == 0.75
+    assert data['counters']['api.get'] == 1
+    assert data['counters']['api.post'] == 1
+    assert data['latency_histogram']['<=0.1'] == 1
+    assert data['latency_histogram']['<=inf'] == 1
+
+    path = str(tmpdir.join('stats.json'))
+    stats.write_json(path)
+    with open(path) as inp:
+        assert json.load(inp) == data
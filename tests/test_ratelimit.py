@@ -0,0 +1,40 @@
+from types import SimpleNamespace
+
+from hassrelease.ratelimit import RateLimiter
+
+
+def response(status_code=200, text='', **headers):
+    return SimpleNamespace(status_code=status_code, headers=headers,
+                           text=text)
+
+
+def test_retries_after_throttle():
+    sleeps = []
+    responses = [
+        response(403, 'You have exceeded a secondary rate limit',
+                 **{'Retry-After': '30'}),
+        response(200, **{'X-RateLimit-Remaining': '4999'}),
+    ]
+    limiter = RateLimiter(4, sleep=sleeps.append)
+
+    resp = limiter.request(lambda *args: responses.pop(0), 'GET', 'url')
+
+    assert resp.status_code == 200
+    assert sleeps == [31]
+    assert limiter.concurrency == 2
+    assert limiter.stats() == {
+        'requests': 2, 'throttled': 1, 'throttled_time': 31,
+        'remaining': 4999}
+
+
+def test_waits_for_reset_when_exhausted():
+    sleeps = []
+    limiter = RateLimiter(sleep=sleeps.append)
+    limiter.request(lambda *args: response(**{
+        'X-RateLimit-Remaining': '0', 'X-RateLimit-Reset': '0'}),
+        'GET', 'url')
+
+    limiter.request(lambda *args: response(), 'GET', 'url')
+
+    assert sleeps == [1]
+    assert limiter.remaining is None
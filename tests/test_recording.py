@@ -0,0 +1,47 @@
+from types import SimpleNamespace
+
+import click
+import requests
+
+from hassrelease.commands import cli, pr_store
+from hassrelease.github import get_milestone_prs, persistent_caches
+from hassrelease.recording import Recorder, Replayer
+
+from .fake_github import FakeGitHub, make_issue
+
+
+def test_record_and_replay(tmp_path):
+    path = str(tmp_path / 'recording')
+
+    with FakeGitHub() as fake:
+        fake.issues['o/r'] = {
+            number: make_issue(number) for number in range(1, 151)}
+        fake.milestones['o/r'] = {3: list(range(1, 151))}
+        repo = fake.repo('o/r')
+        Recorder(path).install(repo.session)
+
+        recorded = get_milestone_prs(repo, 3)
+        issue = repo.session.get(repo._api + '/issues/1')
+
+    # The fake server is gone, all responses come from disk
+    repo = SimpleNamespace(session=requests.Session(), _api=repo._api)
+    Replayer(path).install(repo.session)
+
+    assert get_milestone_prs(repo, 3) == recorded
+    replayed = repo.session.get(repo._api + '/issues/1')
+    assert replayed.json() == issue.json()
+
+    revalidated = repo.session.get(repo._api + '/issues/1', headers={
+        'If-None-Match': issue.headers['ETag']})
+    assert revalidated.status_code == 304
+
+
+def test_recording_bypasses_persistent_caches(tmp_path):
+    with click.Context(cli) as ctx:
+        assert persistent_caches()
+
+        ctx.params = {'replay': str(tmp_path)}
+        assert not persistent_caches()
+        # Nothing from earlier runs, nothing left for later ones
+        assert pr_store().conn.execute(
+            'PRAGMA database_list').fetchone()[2] == ''
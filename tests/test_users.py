@@ -1,7 +1,90 @@
-from hassrelease.users import resolve_user
+from hassrelease.model import PRCache, Release
+from hassrelease.users import UserStore, resolve_user, resolve_users
+
+from .fake_github import FakeGitHub, make_issue
 
 
 def test_resolve_users_from_github_email():
     users = {}
     assert resolve_user(users, '1000+bla@users.noreply.github.com')
     assert users == {'1000+bla@users.noreply.github.com': 'bla'}
+
+
+def test_user_store(tmp_path, monkeypatch):
+    path = str(tmp_path / 'users.csv')
+    with open(path, 'w') as outp:
+        outp.write('a@example.com,alice\nold@example.com\n')
+
+    store = UserStore(path)
+    assert store['a@example.com'] == 'alice'
+
+    # Legacy unresolved entries are tried again, then remembered
+    monkeypatch.setattr('builtins.input', lambda prompt: '')
+    assert not resolve_user(store, 'old@example.com')
+    assert store.is_unresolvable('old@example.com')
+    store['b@example.com'] = 'bob'
+
+    with open(path) as inp:
+        assert len(inp.readlines()) == 4
+
+    store = UserStore(path)
+    assert store.is_unresolvable('old@example.com')
+    assert store['b@example.com'] == 'bob'
+
+    store.compact(force=True)
+    with open(path) as inp:
+        lines = inp.readlines()
+    assert lines[0] == 'a@example.com,alice\n'
+    assert lines[1] == 'b@example.com,bob\n'
+    assert lines[2].startswith('old@example.com,,')
+
+
+def test_resolve_users_in_bulk(tmp_path, monkeypatch):
+    monkeypatch.setattr('hassrelease.model.rev_parse', lambda ref: ref)
+    monkeypatch.setattr('hassrelease.model.get_log', lambda branch: iter([
+        ('c1', [], 'known@example.com', 'Add light (#1)'),
+        ('c2', [], '5+noreply@users.noreply.github.com', 'Add switch (#2)'),
+        ('c3', [], 'commit@example.com', 'Add fan (#3)'),
+        ('c4', [], 'pr@example.com', 'Add lock (#4)'),
+        ('c5', [], 'nobody@example.com', 'Fix typo'),
+    ]))
+    asked = []
+    monkeypatch.setattr('builtins.input', lambda prompt: asked.append(
+        prompt) or '')
+    users = UserStore(str(tmp_path / 'users.csv'))
+    users['known@example.com'] = 'known'
+
+    with FakeGitHub() as fake:
+        fake.issues['o/r'] = {4: make_issue(4, login='pr-author')}
+        fake.commits['o/r'] = {'c3': 'commit-author'}
+        prs = PRCache(fake.repo('o/r'))
+
+        assert resolve_users(
+            users, Release('0.60.0', branch='rc'), prs) == (3, 1)
+        assert len(fake.requests) == 2
+
+    assert users['5+noreply@users.noreply.github.com'] == 'noreply'
+    assert users['commit@example.com'] == 'commit-author'
+    assert users['pr@example.com'] == 'pr-author'
+    assert asked == ['GitHub username for nobody@example.com: ']
+    assert users.is_unresolvable('nobody@example.com')
+
+
+def test_user_store_without_final_newline(tmp_path, capsys):
+    path = str(tmp_path / 'users.csv')
+    with open(path, 'w') as outp:
+        outp.write('a@example.com,alice')
+
+    UserStore(path)['b@example.com'] = 'bob'
+
+    with open(path) as inp:
+        assert inp.read() == 'a@example.com,alice\nb@example.com,bob\n'
+
+    # Lines joined by an older version are skipped, not fatal
+    with open(path, 'a') as outp:
+        outp.write('c@example.com,carolb@example.com,bob\n')
+
+    store = UserStore(path)
+    assert store['b@example.com'] == 'bob'
+    assert 'c@example.com' not in store
+    assert 'malformed' in capsys.readouterr().err